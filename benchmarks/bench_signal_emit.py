@@ -0,0 +1,83 @@
+"""
+bench_signal_emit
+~~~~~~~~~~~~~~~~~
+
+Cost of Signal.emit() with 1, 10 and 100 receivers, connected weakly,
+strongly or aioqueued::
+
+    python benchmarks/bench_signal_emit.py [--number 20000]
+
+Receivers do nothing, so only dispatching is timed. An aioqueued emit only
+queues the call, its dispatcher runs them after timing.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from poster_ocr.gui.util.dispatch import Dispatcher, Signal  # noqa: E402
+
+RECEIVER_COUNTS = (1, 10, 100)
+KINDS = ('weak', 'strong', 'aioqueued')
+
+
+class Receiver:
+    def on_emit(self, value):
+        pass
+
+
+def connect(signal: Signal, kind: str, count: int, dispatcher: Dispatcher) -> list:
+    """Connect count receivers, returned so weak ones stay alive
+    """
+    receivers = [Receiver() for _ in range(count)]
+    for receiver in receivers:
+        if kind == 'weak':
+            signal.connect(receiver.on_emit)
+        elif kind == 'strong':
+            signal.connect(receiver.on_emit, weak=False)
+        else:
+            signal.connect(receiver.on_emit, weak=False, aioqueue=True, dispatcher=dispatcher)
+    return receivers
+
+
+async def bench(kind: str, count: int, number: int, repeat: int) -> float:
+    """Best microseconds per emit over repeat runs of number emits
+    """
+    dispatcher = await Dispatcher().start()
+    signal = Signal('bench', int)
+    receivers = connect(signal, kind, count, dispatcher)
+    # Fewer aioqueued emits per run, each one queues count calls
+    if kind == 'aioqueued':
+        number = max(1, number // count)
+    best = float('inf')
+    for _ in range(repeat):
+        seconds = timeit.timeit(lambda: signal.emit(1), number=number)
+        best = min(best, seconds / number)
+        await dispatcher.drain()
+    await dispatcher.stop()
+    del receivers
+    return best * 1e6
+
+
+async def run(number: int, repeat: int):
+    print('{:<10}'.format('receivers') + ''.join('{:>12}'.format(kind) for kind in KINDS))
+    for count in RECEIVER_COUNTS:
+        row = [await bench(kind, count, number, repeat) for kind in KINDS]
+        print('{:<10}'.format(count) + ''.join('{:>10.2f}us'.format(us) for us in row))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1].replace('\n', ' '))
+    parser.add_argument('--number', type=int, default=20000, help='emits per run')
+    parser.add_argument('--repeat', type=int, default=5, help='runs, the best one is reported')
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.number, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+bench_tag_extract
+~~~~~~~~~~~~~~~~~
+
+Accuracy and speed of TagExtractor on the noisy OCR lines of
+fixtures/ocr_tags.json::
+
+    python benchmarks/bench_tag_extract.py [--filler 20000] [--repeat 200]
+
+Recall is the share of expected tags found among those extracted. A leak is
+an extracted tag holding one of the forbidden credit or promotion phrases.
+Filler names are added to the lexicon, so matching is timed against a
+lexicon of realistic size. Exits with 1 on any leak, or when recall is
+below --min-recall.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from poster_ocr.ocr.fuzzy import fold  # noqa: E402
+from poster_ocr.ocr.tags import LexiconKind, TagExtractor, TagLexicon  # noqa: E402
+
+CORPUS_PATH = os.path.join(ROOT, 'fixtures', 'ocr_tags.json')
+
+
+def filler_names(count: int, seed=0) -> [str]:
+    """count made up CJK and Latin names, the same ones for a seed
+    """
+    rng = random.Random(seed)
+    names = []
+    for i in range(count):
+        if i % 4:
+            names.append(''.join(chr(rng.randint(0x4e00, 0x9fa5)) for _ in range(rng.randint(2, 6))))
+        else:
+            names.append(' '.join(''.join(chr(rng.randint(97, 122)) for _ in range(rng.randint(3, 8)))
+                                  for _ in range(rng.randint(1, 3))))
+    return names
+
+
+def build_lexicon(corpus: dict, filler: int) -> TagLexicon:
+    lexicon = TagLexicon()
+    for name in corpus['lexicon']['titles']:
+        lexicon.add(name, LexiconKind.TITLE)
+    for name in corpus['lexicon']['people']:
+        lexicon.add(name, LexiconKind.PERSON)
+    for i, name in enumerate(filler_names(filler)):
+        lexicon.add(name, LexiconKind.PERSON if i % 2 else LexiconKind.TITLE)
+    return lexicon
+
+
+def accuracy(extractor: TagExtractor, corpus: dict, verbose=False) -> (float, [str]):
+    """Recall of expected tags, and leaked tags as 'poster: tag'
+    """
+    found = expected = 0
+    leaks = []
+    forbidden = [fold(phrase) for phrase in corpus['forbidden']]
+    for poster in corpus['posters']:
+        tags = extractor.extract(poster['lines'])
+        keys = {fold(tag) for tag in tags}
+        missed = [tag for tag in poster['expected'] if fold(tag) not in keys]
+        expected += len(poster['expected'])
+        found += len(poster['expected']) - len(missed)
+        leaks.extend('{}: {}'.format(poster['name'], tag) for tag in tags
+                     if any(phrase in fold(tag) for phrase in forbidden))
+        if verbose:
+            print('{:<20} {}{}'.format(poster['name'], ' | '.join(tags),
+                                       '  (missed {})'.format(', '.join(missed)) if missed else ''))
+    return found / expected if expected else 1.0, leaks
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1].replace('\n', ' '))
+    parser.add_argument('--filler', type=int, default=20000, help='made up names added to the lexicon')
+    parser.add_argument('--repeat', type=int, default=200, help='passes over the corpus when timing')
+    parser.add_argument('--min-recall', type=float, default=0.9)
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('-v', '--verbose', action='store_true', help='print the tags of every poster')
+    args = parser.parse_args(argv)
+
+    with open(args.corpus, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    start = time.perf_counter()
+    lexicon = build_lexicon(corpus, args.filler)
+    lexicon.build()
+    build_ms = (time.perf_counter() - start) * 1000
+    extractor = TagExtractor(lexicon)
+
+    recall, leaks = accuracy(extractor, corpus, args.verbose)
+
+    posters = [poster['lines'] for poster in corpus['posters']]
+    seconds = timeit.timeit(lambda: [extractor.extract(lines) for lines in posters], number=args.repeat)
+    per_poster_us = seconds / (args.repeat * len(posters)) * 1e6
+
+    print('lexicon   {} names, built in {:.0f} ms'.format(len(lexicon), build_ms))
+    print('posters   {}'.format(len(posters)))
+    print('recall    {:.3f}'.format(recall))
+    print('leaks     {}'.format(len(leaks)))
+    for leak in leaks:
+        print('  ' + leak)
+    print('extract   {:.1f} us per poster'.format(per_poster_us))
+    return 1 if leaks or recall < args.min_recall else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
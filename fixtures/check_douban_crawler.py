@@ -0,0 +1,156 @@
+"""
+check_douban_crawler
+~~~~~~~~~~~~~~~~~~~~
+
+Crawl the fixture pages under douban/ served from a local server, under
+plain asyncio without any Qt loop, and check what DoubanCrawler makes of
+them::
+
+    python fixtures/check_douban_crawler.py
+
+The rate limit is set below the number of requests, so the crawl has to
+wait for refills of the token bucket. Exits with 1 if a check fails.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'poster_ocr')]
+
+from poster_ocr.cache.search_cache import SearchCache  # noqa: E402
+from poster_ocr.crawler.douban_crawler import DoubanCrawler  # noqa: E402
+from poster_ocr.crawler.douban_parser import is_partial  # noqa: E402
+from poster_ocr.net.rate_limiter import RateLimiter  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'douban')
+TAGS = ['姜文', '张艺谋', '张国荣']
+TIMEOUT = 20.0
+
+_SUBJECT_PATH = re.compile(r'^/subject/(\d+)/$')
+
+
+class FixtureServer:
+    """Serve subject_suggest.json and subject/<id>.html like movie.douban.com
+
+    A subject without a page answers 500, as a subject page failing to load.
+    """
+
+    def __init__(self, fixture_dir=FIXTURE_DIR):
+        with open(os.path.join(fixture_dir, 'subject_suggest.json'), 'r', encoding='utf-8') as f:
+            suggestions = json.load(f)
+        requests = self.requests = Counter()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                requests[url.path] += 1
+                match = _SUBJECT_PATH.match(url.path)
+                if url.path == '/j/subject_suggest':
+                    query = parse_qs(url.query).get('q', [''])[0]
+                    self._reply(200, 'application/json', json.dumps(suggestions.get(query, []), ensure_ascii=False))
+                elif match is not None:
+                    page = os.path.join(fixture_dir, 'subject', match.group(1) + '.html')
+                    if not os.path.isfile(page):
+                        self._reply(500, 'text/plain', 'fixture has no page')
+                        return
+                    with open(page, 'r', encoding='utf-8') as f:
+                        self._reply(200, 'text/html; charset=utf-8', f.read())
+                else:
+                    self._reply(404, 'text/plain', 'not found')
+
+            def _reply(self, status, content_type, body):
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:{}/'.format(self._server.server_port)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+async def check(server: FixtureServer, cache_path: str) -> [str]:
+    """Failed checks, empty if all passed
+    """
+    failures = []
+
+    def expect(ok, message):
+        if not ok:
+            failures.append(message)
+
+    cache = SearchCache(cache_path)
+    # Fewer tokens than requests, the crawl must wait for refills
+    limiter = RateLimiter(rate=20, burst=4)
+    crawler = DoubanCrawler(server.url, cache=cache, limiter=limiter)
+    streamed = []
+    crawler.result_found.connect(streamed.extend, weak=False)
+
+    try:
+        results = await asyncio.wait_for(crawler.crawl_tags(TAGS), TIMEOUT)
+    except asyncio.TimeoutError:
+        return ['crawl did not finish within {} seconds'.format(TIMEOUT)]
+
+    titles = [info.title_display for info in results]
+    expect(len(results) == 9, 'expected 9 movies, got {}: {}'.format(len(results), titles))
+    expect(sorted(titles) == sorted(info.title_display for info in streamed),
+           'results streamed through result_found differ from those returned')
+    expect(server.requests['/j/subject_suggest'] == len(TAGS), 'every tag is suggested once')
+
+    by_title = {info.title_display: info for info in results}
+    info = by_title.get('让子弹飞')
+    expect(info is not None and info.staffs_display == '姜文 / 姜文 / 葛优 / 周润发'
+           and info.rate_display == '8.9' and info.date_display == '2010-12-16(中国大陆)'
+           and info.description_display.get('genres') == ['剧情', '喜剧', '动作'],
+           'fields of 让子弹飞 are not parsed from its page')
+
+    partial = by_title.get('一步之遥')
+    expect(partial is not None and is_partial(partial), 'a subject whose page fails is kept from its suggestion')
+    expect(cache.get('姜文') is None, 'results holding a partial subject are not cached')
+    expect(cache.get('张艺谋') is not None and cache.get('张国荣') is not None, 'complete results are cached')
+
+    before = sum(server.requests.values())
+    again = await asyncio.wait_for(crawler.crawl_tags(['张艺谋', '张国荣']), TIMEOUT)
+    expect(len(again) == 5 and sum(server.requests.values()) == before, 'cached tags are crawled again')
+    return failures
+
+
+def main() -> int:
+    # The subject without a page is expected to fail, do not print its warning
+    logging.basicConfig(level=logging.ERROR)
+    with FixtureServer() as server, tempfile.TemporaryDirectory() as tmp:
+        failures = asyncio.run(check(server, os.path.join(tmp, 'search.json')))
+    for failure in failures:
+        print('FAIL', failure)
+    if not failures:
+        print('OK, {} requests served'.format(sum(server.requests.values())))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
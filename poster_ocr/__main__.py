@@ -1,10 +1,22 @@
-import logging, time
+import argparse
+import asyncio
+import logging, sys
 
 from PyQt5.QtWidgets import QApplication
+from qasync import QEventLoop
 
-from poster_ocr.gui.client_widget import ClientWidget
+from poster_ocr.cache.ocr_cache import OcrCache
+from poster_ocr.cache.search_cache import SearchCache
+from poster_ocr.crawler.douban_crawler import DoubanCrawler
+from poster_ocr.dao.history_pane_dao import HistoryInfoDao
+from poster_ocr.gui.client_widget import ClientWidget, DEFAULT_USER_ID
+from poster_ocr.gui.util.dispatch import Signal
+from poster_ocr.gui.util.excpetion import OcrQueueFullException
+from poster_ocr.ocr.batch import BatchOcr, BatchJournal, default_journal_path
+from poster_ocr.ocr.engine import create_engine
+from poster_ocr.ocr.pool import OcrWorkerPool
+from poster_ocr.ocr.tags import TagExtractor, TagLexicon
 from vo.douban_movie import DoubanMovieInfo
-from vo.history_item import HistoryItemInfo
 
 
 def set_logger():
@@ -14,23 +26,22 @@ def set_logger():
 
 
 def main():
-    import sys
     app = QApplication(sys.argv)
     app.setStyle("macintosh")
 
     set_logger()
 
-    application_window = ClientWidget()
+    loop = QEventLoop(app)
+    asyncio.set_event_loop(loop)
+    Signal.setup_aio_support(loop)
+
+    history_dao = HistoryInfoDao()
+    application_window = ClientWidget(history_dao)
     application_window.resize(1600, 900)
     application_window.show()
 
     application_window.add_new_tags(["挺好挺好，整挺好", "不是吧不是吧，不会真的有人觉得挺好吧",
     "唉，你觉得挺好，那也不是不能挺好"])
-    application_window.add_new_record_for_user(HistoryItemInfo(r"C:\Users\user\Pictures\PIXIVEL\[ArseniXC]57915845.jpg",
-                                                               "好耶！", time.time()))
-    application_window.add_new_record_for_user(HistoryItemInfo(r"C:\Users\user\Pictures\PIXIVEL\新建文件夹\["
-                                                               r"雨傘ゆん]78838119.jpg",
-                                                               "好耶！", time.time()))
 
     movie_list = [
         DoubanMovieInfo("Bastard Asshole", "张艺谋", "https://img1.doubanio.com/view/photo/s_ratio_poster/public/p2575043939.webp",
@@ -47,10 +58,92 @@ def main():
         application_window.display_douban_results(movie_list)
     except Exception as e:
         print(e)
-    sys.exit(app.exec_())
 
-def on_crawl_called():
-    target =
+    search_cache = SearchCache()
+    app.aboutToQuit.connect(search_cache.save)
+    lexicon = TagLexicon.load()
+    app.aboutToQuit.connect(lexicon.save)
+    extractor = TagExtractor(lexicon)
+    crawler = DoubanCrawler(cache=search_cache, lexicon=lexicon)
+    crawler.result_found.connect(application_window.append_douban_results, weak=False, aioqueue=True)
+    application_window.crawl_for_listed_tags_needed.connect(
+        lambda tags: on_crawl_called(application_window, crawler, tags))
+
+    ocr_pool = OcrWorkerPool(create_engine(), cache=OcrCache())
+    app.aboutToQuit.connect(ocr_pool.shutdown)
+    ocr_pool.recognized.connect(lambda _, lines: application_window.add_new_tags(extractor.extract(lines)),
+                                weak=False, aioqueue=True)
+    ocr_pool.regions_found.connect(application_window.show_cover_regions, weak=False, aioqueue=True)
+    application_window.ocr_for_cover_file_needed.connect(lambda path: on_ocr_called(ocr_pool, path))
+
+    batch = BatchOcr(ocr_pool, history_dao, DEFAULT_USER_ID, extractor=extractor)
+    batch.progress.connect(application_window.show_batch_progress, weak=False, aioqueue=True)
+    batch.records_written.connect(application_window.show_history, weak=False, aioqueue=True)
+    batch.finished.connect(application_window.finish_batch_progress, weak=False, aioqueue=True)
+    application_window.batch_ocr_for_folder_needed.connect(batch.start)
+    application_window.batch_ocr_cancel_needed.connect(batch.cancel)
+
+    with loop:
+        loop.run_forever()
+
+
+def on_crawl_called(window: ClientWidget, crawler: DoubanCrawler, tags: [str]):
+    """Replace displayed results with those crawled for tags as they arrive
+    """
+    window.clear_douban_results()
+    crawler.start(tags)
+
+
+def on_ocr_called(ocr_pool: OcrWorkerPool, path: str):
+    """Recognize tags on cover at path, they are added to tag panel when done
+    """
+    try:
+        ocr_pool.submit(path)
+    except OcrQueueFullException as e:
+        ClientWidget.warning(str(e))
+
+
+def batch_main(argv=None) -> int:
+    """Recognize every poster under a folder without GUI
+
+    Interrupting it with Ctrl+C is safe, running it again resumes the batch.
+    """
+    parser = argparse.ArgumentParser(prog='poster_ocr batch', description=batch_main.__doc__.split('\n')[0])
+    parser.add_argument('folder', help='folder of posters, searched recursively')
+    parser.add_argument('--user', default=DEFAULT_USER_ID, help='user to record history for')
+    parser.add_argument('--workers', type=int, default=None, help='number of OCR processes')
+    parser.add_argument('--restart', action='store_true', help='forget progress of a previous run')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format='[%(asctime)s-%(filename)s-%(levelname)s:%(message)s]', level=logging.WARNING)
+
+    journal = BatchJournal(default_journal_path(args.folder))
+    if args.restart:
+        journal.clear()
+
+    ocr_pool = OcrWorkerPool(create_engine(), max_workers=args.workers, cache=OcrCache())
+    history_dao = HistoryInfoDao()
+    batch = BatchOcr(ocr_pool, history_dao, args.user, extractor=TagExtractor(TagLexicon.load()))
+
+    def on_progress(recognized, failed, found):
+        print('\rRecognized {} of {} posters found, {} failed'.format(recognized, found, failed),
+              end='', file=sys.stderr, flush=True)
+    batch.progress.connect(on_progress, weak=False)
+
+    try:
+        recognized, failed = asyncio.run(batch.run(args.folder, journal))
+    except KeyboardInterrupt:
+        print('\nInterrupted, run again to resume', file=sys.stderr)
+        return 130
+    finally:
+        ocr_pool.shutdown()
+        history_dao.close()
+    print('\nRecognized {} posters, {} failed, journal at {}'.format(recognized, failed, journal.path),
+          file=sys.stderr)
+    return 1 if failed else 0
+
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'batch':
+        sys.exit(batch_main(sys.argv[2:]))
     main()
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from poster_ocr.cache.paths import cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RESULTS = 100000
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_DB_NAME = 'ocr.sqlite3'
+
+_SQL_CREATE = (
+    """
+    CREATE TABLE IF NOT EXISTS file_digest (
+        path     TEXT PRIMARY KEY,
+        size     INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        digest   TEXT NOT NULL
+    )""",
+    """
+    CREATE TABLE IF NOT EXISTS ocr_result (
+        digest      TEXT NOT NULL,
+        engine_key  TEXT NOT NULL,
+        tags        TEXT NOT NULL,
+        regions     TEXT NOT NULL DEFAULT '[]',
+        last_access REAL NOT NULL,
+        PRIMARY KEY (digest, engine_key)
+    )""",
+    "CREATE INDEX IF NOT EXISTS ocr_result_last_access ON ocr_result (last_access)",
+)
+_SQL_SELECT_DIGEST = "SELECT size, mtime_ns, digest FROM file_digest WHERE path = ?"
+_SQL_UPSERT_DIGEST = "INSERT OR REPLACE INTO file_digest (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)"
+_SQL_RESULT_COLUMNS = "PRAGMA table_info(ocr_result)"
+_SQL_ADD_REGIONS = "ALTER TABLE ocr_result ADD COLUMN regions TEXT NOT NULL DEFAULT '[]'"
+_SQL_SELECT_RESULT = "SELECT tags, regions FROM ocr_result WHERE digest = ? AND engine_key = ?"
+_SQL_TOUCH_RESULT = "UPDATE ocr_result SET last_access = ? WHERE digest = ? AND engine_key = ?"
+_SQL_UPSERT_RESULT = ("INSERT OR REPLACE INTO ocr_result (digest, engine_key, tags, regions, last_access) "
+                      "VALUES (?, ?, ?, ?, ?)")
+_SQL_COUNT_RESULT = "SELECT COUNT(*) FROM ocr_result"
+_SQL_EVICT_RESULT = ("DELETE FROM ocr_result WHERE rowid IN "
+                     "(SELECT rowid FROM ocr_result ORDER BY last_access ASC LIMIT ?)")
+_SQL_EVICT_DIGEST = "DELETE FROM file_digest WHERE digest NOT IN (SELECT digest FROM ocr_result)"
+
+
+def file_digest(path: str) -> str:
+    """sha256 of the file content, read in chunks
+    """
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class OcrCache:
+    """OCR results stored in SQLite by content of the picture
+
+    Results are keyed by (sha256 of the file, engine key), the engine key
+    naming the engine with every setting that changes its output, so a copy
+    of a poster under another path hits the same result. The digest of a
+    path is remembered with its size and mtime, an unchanged file is never
+    hashed twice. Least recently used results are dropped beyond
+    ``max_results``. Text regions the engine detected are kept beside the
+    tags, as lists of relative (x, y, width, height).
+
+    The cache is safe to share between threads, lookup() reads the file and
+    is better called off the GUI thread.
+
+    Attributes:
+        hits:       Lookups answered by a stored result
+        misses:     Lookups which found nothing
+        hashed:     Files hashed because their digest was unknown or stale
+    """
+
+    def __init__(self, path=None, max_results=DEFAULT_MAX_RESULTS):
+        self._path = os.path.abspath(path) if path else os.path.join(cache_dir('ocr'), _DB_NAME)
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        self._max_results = max_results
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            for sql in _SQL_CREATE:
+                self._conn.execute(sql)
+            # Databases written before regions were stored
+            columns = [row[1] for row in self._conn.execute(_SQL_RESULT_COLUMNS)]
+            if 'regions' not in columns:
+                self._conn.execute(_SQL_ADD_REGIONS)
+        self._count = self._conn.execute(_SQL_COUNT_RESULT).fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.hashed = 0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def digest(self, path: str) -> str:
+        """Content digest of path, hashing it only if size or mtime changed
+
+        :raise OSError: path can not be read
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(_SQL_SELECT_DIGEST, (path,)).fetchone()
+        if row is not None and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+
+        digest = file_digest(path)
+        self.hashed += 1
+        with self._lock, self._conn:
+            self._conn.execute(_SQL_UPSERT_DIGEST, (path, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def lookup(self, path: str, engine_key: str) -> (str, tuple):
+        """(digest, (tags, regions)) of path, the result is None on miss and
+        both are None if path can not be read
+        """
+        try:
+            digest = self.digest(path)
+        except OSError:
+            self.misses += 1
+            return None, None
+        return digest, self.get(digest, engine_key)
+
+    def get(self, digest: str, engine_key: str) -> (list, list):
+        """(tags, regions) stored for digest, None on miss
+        """
+        with self._lock:
+            row = self._conn.execute(_SQL_SELECT_RESULT, (digest, engine_key)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self._conn:
+                self._conn.execute(_SQL_TOUCH_RESULT, (time.time(), digest, engine_key))
+            self.hits += 1
+        return json.loads(row[0]), [tuple(box) for box in json.loads(row[1])]
+
+    def put(self, digest: str, engine_key: str, tags: [str], regions: [tuple] = ()):
+        with self._lock, self._conn:
+            exists = self._conn.execute(_SQL_SELECT_RESULT, (digest, engine_key)).fetchone() is not None
+            self._conn.execute(_SQL_UPSERT_RESULT, (digest, engine_key, json.dumps(tags, ensure_ascii=False),
+                                                    json.dumps(list(regions)), time.time()))
+            if not exists:
+                self._count += 1
+            if self._count > self._max_results:
+                # Evict a tenth more than needed, so digests are swept once per many puts
+                keep = self._max_results - self._max_results // 10
+                self._conn.execute(_SQL_EVICT_RESULT, (self._count - keep,))
+                self._conn.execute(_SQL_EVICT_DIGEST)
+                self._count = keep
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM ocr_result")
+            self._conn.execute("DELETE FROM file_digest")
+            self._count = 0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hashed': self.hashed,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
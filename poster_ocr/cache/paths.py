@@ -0,0 +1,24 @@
+import os
+
+CACHE_DIR_ENV = 'POSTER_OCR_CACHE_DIR'
+
+
+def cache_root() -> str:
+    """Absolute root directory for every on-disk cache of the application
+
+    Can be overridden with the POSTER_OCR_CACHE_DIR environment variable.
+    """
+    root = os.environ.get(CACHE_DIR_ENV)
+    if not root:
+        filepath = os.path.abspath(__file__)
+        dirname = os.path.dirname(filepath)
+        root = os.path.join(dirname, '../../cache')
+    return os.path.normpath(root)
+
+
+def cache_dir(name: str) -> str:
+    """Absolute sub directory of cache root, created if missing
+    """
+    path = os.path.join(cache_root(), name)
+    os.makedirs(path, exist_ok=True)
+    return path
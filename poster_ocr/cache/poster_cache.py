@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from poster_ocr.cache.paths import cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_INDEX_NAME = 'index.sqlite3'
+
+_SQL_CREATE = """
+CREATE TABLE IF NOT EXISTS poster (
+    key         TEXT PRIMARY KEY,
+    url         TEXT NOT NULL,
+    file_name   TEXT NOT NULL,
+    size        INTEGER NOT NULL,
+    last_access REAL NOT NULL
+)"""
+_SQL_CREATE_INDEX = "CREATE INDEX IF NOT EXISTS poster_last_access ON poster (last_access)"
+_SQL_SELECT = "SELECT file_name FROM poster WHERE key = ?"
+_SQL_TOUCH = "UPDATE poster SET last_access = ? WHERE key = ?"
+_SQL_UPSERT = "INSERT OR REPLACE INTO poster (key, url, file_name, size, last_access) VALUES (?, ?, ?, ?, ?)"
+_SQL_DELETE = "DELETE FROM poster WHERE key = ?"
+_SQL_TOTAL = "SELECT COALESCE(SUM(size), 0) FROM poster"
+_SQL_OLDEST = "SELECT key, file_name, size FROM poster ORDER BY last_access ASC LIMIT ?"
+
+
+def url_key(url: str) -> str:
+    """Content address of a poster, sha1 of its url
+    """
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class PosterCache:
+    """Bounded on-disk cache of downloaded posters
+
+    Files live under ``<cache_dir>/<key[:2]>/<key><ext>`` and are indexed by
+    a SQLite table keyed by url hash, so looking up a poster never touches
+    the directory. Writes go to a temp file first and are renamed into place,
+    a half written poster is never visible to readers. Least recently used
+    posters are evicted once the total size exceeds ``max_bytes``.
+
+    The cache is safe to share between threads.
+
+    Attributes:
+        hits:       Lookups answered by the cache
+        misses:     Lookups that found nothing usable
+        evictions:  Posters removed to stay under the byte budget
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self._path = os.path.abspath(path) if path else cache_dir('poster')
+        os.makedirs(self._path, exist_ok=True)
+        self._max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self._path, _INDEX_NAME), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SQL_CREATE)
+        self._conn.execute(_SQL_CREATE_INDEX)
+        self._conn.commit()
+
+        self._total_bytes = self._conn.execute(_SQL_TOTAL).fetchone()[0]
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    def set_max_bytes(self, max_bytes: int):
+        with self._lock:
+            self._max_bytes = max_bytes
+            self._evict_locked()
+
+    def contains(self, url: str) -> bool:
+        """Whether the poster is cached, without touching counters or LRU order
+        """
+        with self._lock:
+            return self._conn.execute(_SQL_SELECT, (url_key(url),)).fetchone() is not None
+
+    def get_path(self, url: str):
+        """Absolute path of the cached poster for url, or None on miss
+        """
+        key = url_key(url)
+        with self._lock:
+            row = self._conn.execute(_SQL_SELECT, (key,)).fetchone()
+            if row is not None:
+                file_path = self._file_path(row[0])
+                if os.path.exists(file_path):
+                    self._conn.execute(_SQL_TOUCH, (time.time(), key))
+                    self._conn.commit()
+                    self.hits += 1
+                    return file_path
+                # Removed behind our back, forget about it
+                self._drop_locked(key, row[0], remove_file=False)
+            self.misses += 1
+            return None
+
+    def put(self, url: str, data: bytes) -> str:
+        """Store poster bytes for url and return the absolute path of the file
+        """
+        key = url_key(url)
+        file_name = os.path.join(key[:2], key + _guess_suffix(url))
+        file_path = self._file_path(file_name)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM poster WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._total_bytes -= row[0]
+            self._conn.execute(_SQL_UPSERT, (key, url, file_name, len(data), time.time()))
+            self._total_bytes += len(data)
+            self._evict_locked(keep=key)
+            self._conn.commit()
+        return file_path
+
+    def remove(self, url: str) -> bool:
+        key = url_key(url)
+        with self._lock:
+            row = self._conn.execute(_SQL_SELECT, (key,)).fetchone()
+            if row is None:
+                return False
+            self._drop_locked(key, row[0])
+            self._conn.commit()
+            return True
+
+    def clear(self):
+        with self._lock:
+            for key, file_name, _ in self._conn.execute(_SQL_OLDEST, (-1,)).fetchall():
+                self._drop_locked(key, file_name)
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'bytes': self._total_bytes,
+            'max_bytes': self._max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _file_path(self, file_name: str) -> str:
+        return os.path.join(self._path, file_name)
+
+    def _drop_locked(self, key, file_name, remove_file=True):
+        row = self._conn.execute("SELECT size FROM poster WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self._total_bytes -= row[0]
+        self._conn.execute(_SQL_DELETE, (key,))
+        if remove_file:
+            try:
+                os.remove(self._file_path(file_name))
+            except FileNotFoundError:
+                pass
+
+    def _evict_locked(self, keep=None):
+        while self._total_bytes > self._max_bytes:
+            rows = self._conn.execute(_SQL_OLDEST, (16,)).fetchall()
+            rows = [r for r in rows if r[0] != keep]
+            if not rows:
+                break
+            for key, file_name, _ in rows:
+                if self._total_bytes <= self._max_bytes:
+                    break
+                self._drop_locked(key, file_name)
+                self.evictions += 1
+                logger.debug('evict poster %s', key)
+
+
+def _guess_suffix(url: str) -> str:
+    _, ext = os.path.splitext(urlsplit(url).path)
+    if 0 < len(ext) <= 5:
+        return ext.lower()
+    return ''
@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import unicodedata
+from collections import OrderedDict
+
+from poster_ocr.cache.paths import cache_dir
+from poster_ocr.gui.util import aio
+from poster_ocr.vo.douban_movie import DoubanMovieInfo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 12 * 60 * 60
+DEFAULT_MAX_ENTRIES = 512
+
+_FILE_NAME = 'search.json'
+_FORMAT_VERSION = 1
+
+
+def normalize_tag(tag: str) -> str:
+    """Tags recognized from different posters differ in width, case and spaces,
+    fold them so they hit the same entry
+    """
+    return ' '.join(unicodedata.normalize('NFKC', tag).casefold().split())
+
+
+def make_key(tags) -> str:
+    """Cache key of a tag, or of a tag set regardless of its order and duplicates
+    """
+    if isinstance(tags, str):
+        return normalize_tag(tags)
+    return json.dumps(sorted({normalize_tag(tag) for tag in tags}), ensure_ascii=False)
+
+
+class SearchCache:
+    """Crawled DoubanMovieInfo results by normalized tag
+
+    Entries expire ttl seconds after they were stored and the least recently
+    used ones are dropped beyond max_entries. get_or_fetch() coalesces
+    concurrent fetches of a key, callers share one fetch and its result.
+
+    Entries are kept in a JSON file, read when the cache is created and
+    written by save(). The cache lives on the event loop thread.
+
+    Attributes:
+        hits:       Lookups answered by a fresh entry
+        misses:     Lookups which needed a fetch
+        coalesced:  Lookups which joined a fetch already running
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self._path = os.path.abspath(path) if path else os.path.join(cache_dir('search'), _FILE_NAME)
+        self._ttl = ttl
+        self._max_entries = max_entries
+
+        # key -> (stored_at, [DoubanMovieInfo]), least recently used first
+        self._entries = OrderedDict()
+        self._fetching = {}
+        self._dirty = False
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._load()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, tags) -> [DoubanMovieInfo]:
+        """Fresh results of tags, None if missing or expired
+        """
+        key = make_key(tags)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > self._ttl:
+            del self._entries[key]
+            self._dirty = True
+            return None
+        self._entries.move_to_end(key)
+        return list(entry[1])
+
+    def put(self, tags, results: [DoubanMovieInfo]):
+        self._store(make_key(tags), results)
+
+    def _store(self, key, results):
+        self._entries[key] = (time.time(), list(results))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def invalidate(self, tags):
+        if self._entries.pop(make_key(tags), None) is not None:
+            self._dirty = True
+
+    def clear(self):
+        self._entries.clear()
+        self._dirty = True
+
+    async def get_or_fetch(self, tags, fetch, cacheable=None) -> [DoubanMovieInfo]:
+        """Results of tags, from the cache or from ``await fetch()``
+
+        While a fetch of the same key is running, the caller waits for it
+        instead of starting another one. Cancelling a caller does not cancel
+        a fetch other callers wait for. Failed fetches are not cached, nor
+        results for which ``cacheable(results)`` is false.
+        """
+        results = self.get(tags)
+        if results is not None:
+            self.hits += 1
+            return results
+
+        key = make_key(tags)
+        task = self._fetching.get(key)
+        if task is None:
+            self.misses += 1
+            task = aio.create_task(self._fetch(key, fetch, cacheable))
+            self._fetching[key] = task
+        else:
+            self.coalesced += 1
+        return list(await asyncio.shield(task))
+
+    async def _fetch(self, key, fetch, cacheable):
+        try:
+            results = await fetch()
+            if cacheable is None or cacheable(results):
+                self._store(key, results)
+            return results
+        finally:
+            self._fetching.pop(key, None)
+
+    def _load(self):
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning('read search cache %s failed', self._path, exc_info=True)
+            return
+        if not isinstance(data, dict) or data.get('version') != _FORMAT_VERSION:
+            return
+
+        now = time.time()
+        skipped = 0
+        entries = data.get('entries')
+        for e in entries if isinstance(entries, list) else []:
+            try:
+                stored_at = float(e['stored_at'])
+                if now - stored_at <= self._ttl:
+                    self._entries[e['key']] = (stored_at, [DoubanMovieInfo.from_dict(d) for d in e['results']])
+            except (KeyError, TypeError, ValueError, AttributeError):
+                skipped += 1
+        if skipped:
+            logger.warning('skip %d malformed entries of search cache %s', skipped, self._path)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def save(self):
+        """Write entries to disk if changed, through a temp file renamed into place
+        """
+        if not self._dirty:
+            return
+        data = {
+            'version': _FORMAT_VERSION,
+            'entries': [{'key': key, 'stored_at': stored_at, 'results': [info.to_dict() for info in results]}
+                        for key, (stored_at, results) in self._entries.items()],
+        }
+        dirname = os.path.dirname(self._path)
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+        except OSError:
+            logger.exception('write search cache %s failed', self._path)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._dirty = False
@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtGui import QImage, QPainter
+
+from poster_ocr.cache.paths import cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+DEFAULT_QUALITY = 85
+
+_SUFFIX = '.jpg'
+
+
+class ThumbnailStore:
+    """Pre-scaled covers kept on disk as small JPEG files
+
+    A thumbnail is addressed by (source path, source mtime, source size,
+    target size, aspect mode), so validating it costs a single stat of the
+    source and editing the source simply makes the old thumbnail unreachable.
+    Unreachable and old thumbnails are dropped by trim().
+
+    Thumbnails are written through a temp file and renamed into place, the
+    store can be used from any thread.
+    """
+
+    def __init__(self, path=None, quality=DEFAULT_QUALITY, max_bytes=DEFAULT_MAX_BYTES):
+        self._path = os.path.abspath(path) if path else cache_dir('thumbnail')
+        os.makedirs(self._path, exist_ok=True)
+        self._quality = quality
+        self._max_bytes = max_bytes
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def thumbnail_path(self, source: str, size: QSize, aspect_mode=Qt.KeepAspectRatio):
+        """Path of the thumbnail for the current version of source, None if source is missing
+        """
+        try:
+            st = os.stat(source)
+        except OSError:
+            return None
+        raw = '{}\0{}\0{}\0{}x{}\0{}'.format(os.path.abspath(source), st.st_mtime_ns, st.st_size,
+                                             size.width(), size.height(), int(aspect_mode))
+        key = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        return os.path.join(self._path, key[:2], key + _SUFFIX)
+
+    def load(self, source: str, size: QSize, aspect_mode=Qt.KeepAspectRatio) -> QImage:
+        """Stored thumbnail of source, a null image on miss
+        """
+        path = self.thumbnail_path(source, size, aspect_mode)
+        if path is None or not os.path.exists(path):
+            return QImage()
+        image = QImage(path)
+        if not image.isNull():
+            # Keep recently used thumbnails away from trim(), the image is read whether or not it works
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return image
+
+    def save(self, source: str, size: QSize, image: QImage, aspect_mode=Qt.KeepAspectRatio) -> bool:
+        path = self.thumbnail_path(source, size, aspect_mode)
+        if path is None or image.isNull():
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if image.hasAlphaChannel():
+            # JPEG has no alpha, flatten onto white instead of black
+            flat = QImage(image.size(), QImage.Format_RGB32)
+            flat.fill(Qt.white)
+            painter = QPainter(flat)
+            painter.drawImage(0, 0, image)
+            painter.end()
+            image = flat
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+        os.close(fd)
+        try:
+            if not image.save(tmp_path, 'JPG', self._quality):
+                logger.warning('save thumbnail for %s failed', source)
+                return False
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return True
+
+    def trim(self):
+        """Remove least recently used thumbnails until under the byte budget
+        """
+        entries = []
+        total = 0
+        for sub in os.scandir(self._path):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+
+        entries.sort()
+        removed = 0
+        for _, file_size, path in entries:
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= file_size
+            removed += 1
+        if removed:
+            logger.debug('trim %d thumbnails', removed)
+        return removed
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import weakref
+from functools import partial
+from urllib.parse import urljoin
+
+from poster_ocr.cache.search_cache import SearchCache, normalize_tag
+from poster_ocr.crawler.douban_parser import is_partial, parse_subject_page, suggestion_to_info
+from poster_ocr.gui.util import aio
+from poster_ocr.gui.util.dispatch import Signal
+from poster_ocr.net.rate_limiter import Priority, RateLimiter, get_rate_limiter
+from poster_ocr.net.session import get_session, http_executor, DEFAULT_TIMEOUT
+from poster_ocr.ocr.fuzzy import similarity
+from poster_ocr.ocr.tags import TagLexicon, segments
+from poster_ocr.vo.douban_movie import DoubanMovieInfo
+
+logger = logging.getLogger(__name__)
+
+DOUBAN_MOVIE_URL = 'https://movie.douban.com/'
+SUGGEST_PATH = 'j/subject_suggest'
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RESULTS_PER_TAG = 5
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                  'Chrome/86.0.4240.75 Safari/537.36',
+}
+
+
+def subject_key(info: DoubanMovieInfo) -> str:
+    return info.description_display.get('url') or info.title_display
+
+
+def match_score(tag: str, info: DoubanMovieInfo) -> float:
+    """Similarity of tag to the title of info, either script of it, or one of its staffs
+    """
+    title = info.title_display or ''
+    # Staffs are joined by ' / ', see douban_parser
+    names = [title] + segments(title) + (info.staffs_display or '').split('/')
+    return max((similarity(tag, name) for name in names if name.strip()), default=0.0)
+
+
+def _complete(infos: [DoubanMovieInfo]) -> bool:
+    return not any(is_partial(info) for info in infos)
+
+
+class DoubanCrawler:
+    """Search douban movies for OCR tags
+
+    Every tag is looked up with the subject_suggest API, then the page of
+    each suggested subject is read for staffs, date and rate. Requests of all
+    tags share a limit of max_concurrency requests in flight, and run with
+    parsing on the HTTP executor so the event loop only schedules them.
+    Each request also waits for a token of the shared RateLimiter, at
+    background priority by default so it yields to posters the user waits
+    for.
+
+    Results are emitted through result_found as soon as a tag is searched,
+    a subject suggested for several tags is only read and emitted once. With
+    a SearchCache, results of a tag are reused until they expire and crawls
+    running at the same time share the search of a tag. Results holding a
+    subject whose page could not be read are not cached, the next crawl
+    tries again.
+
+    With a TagLexicon, tags are first corrected to the known title or name
+    nearest to them, results of a tag are ranked by match_score() against
+    it, and titles and staffs found are added to the lexicon.
+
+    base_url can point to any server serving the same paths, e.g. a local
+    server with fixture pages.
+    """
+
+    def __init__(self, base_url=DOUBAN_MOVIE_URL, max_concurrency=DEFAULT_CONCURRENCY,
+                 results_per_tag=DEFAULT_RESULTS_PER_TAG, timeout=DEFAULT_TIMEOUT, cache: SearchCache = None,
+                 limiter: RateLimiter = None, priority=Priority.BACKGROUND, lexicon: TagLexicon = None):
+        self._base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self._max_concurrency = max_concurrency
+        self._results_per_tag = results_per_tag
+        self._timeout = timeout
+        self._cache = cache
+        self._limiter = limiter if limiter is not None else get_rate_limiter()
+        self._priority = priority
+        self._lexicon = lexicon
+
+        self._task = None
+        # A semaphore only works on the loop it first waited on, one per loop
+        self._semaphores = weakref.WeakKeyDictionary()
+        self._subjects = {}
+
+        self.result_found = Signal('result_found', list)
+        """Emitted with a list of DoubanMovieInfo"""
+
+        self.crawl_finished = Signal('crawl_finished')
+
+    def start(self, tags: [str]):
+        """Crawl tags in background, cancelling the crawl in progress if any
+        """
+        self.cancel()
+        self._task = aio.create_task(self.crawl_tags(list(tags)))
+        return self._task
+
+    def cancel(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def crawl_tags(self, tags: [str]) -> [DoubanMovieInfo]:
+        """Search every tag concurrently, streaming results of each tag through result_found
+
+        :return: Results of all tags, best matching first
+        """
+        seen = set()
+        results = []
+        scores = {}
+        if self._lexicon is not None:
+            tags = self.correct_tags(tags)
+
+        async def crawl_tag(tag):
+            try:
+                if self._cache is None:
+                    infos = await self._search_tag(tag)
+                else:
+                    infos = await self._cache.get_or_fetch(tag, partial(self._search_tag, tag), _complete)
+            except asyncio.CancelledError:
+                raise
+            except Exception:  # noqa
+                logger.exception('search tag %s failed', tag)
+                return
+            found = []
+            for info in infos:
+                key = subject_key(info)
+                if key not in seen:
+                    seen.add(key)
+                    found.append(info)
+                    scores[key] = match_score(tag, info)
+            if found:
+                if self._lexicon is not None:
+                    self._lexicon.add_movie_infos(found)
+                found.sort(key=lambda i: scores[subject_key(i)], reverse=True)
+                results.extend(found)
+                self.result_found.emit(found)
+
+        try:
+            await asyncio.gather(*(crawl_tag(tag) for tag in tags if normalize_tag(tag)))
+        finally:
+            self.crawl_finished.emit()
+        results.sort(key=lambda i: scores[subject_key(i)], reverse=True)
+        return results
+
+    def correct_tags(self, tags: [str]) -> [str]:
+        """Tags replaced by the known title or name nearest to them, duplicates dropped
+        """
+        corrected = []
+        keys = set()
+        for tag in tags:
+            tag = self._lexicon.correct(tag)
+            key = normalize_tag(tag)
+            if key not in keys:
+                keys.add(key)
+                corrected.append(tag)
+        return corrected
+
+    async def _search_tag(self, tag: str) -> [DoubanMovieInfo]:
+        suggestions = await self._limited(self._read_suggestions, self._base_url, tag)
+        subjects = suggestions[:self._results_per_tag]
+        return list(await asyncio.gather(*(self._subject_info(s) for s in subjects)))
+
+    async def _subject_info(self, suggestion: dict) -> DoubanMovieInfo:
+        """Info of a suggested subject, tags suggesting the same subject share one read
+        """
+        key = suggestion.get('url')
+        if not key:
+            return suggestion_to_info(suggestion)
+        task = self._subjects.get(key)
+        if task is None:
+            task = aio.create_task(self._read_subject_info(suggestion))
+            self._subjects[key] = task
+            task.add_done_callback(lambda _: self._subjects.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _read_subject_info(self, suggestion: dict) -> DoubanMovieInfo:
+        try:
+            return await self._limited(self._read_subject, urljoin(self._base_url, suggestion['url']), suggestion)
+        except Exception:  # noqa
+            logger.warning('read subject %s failed', suggestion.get('url'), exc_info=True)
+            return suggestion_to_info(suggestion, partial=True)
+
+    async def _limited(self, func, url, *args):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self._max_concurrency)
+        async with semaphore:
+            await self._limiter.acquire(url, self._priority)
+            return await aio.run_in_executor(http_executor, func, *args)
+
+    def _read_suggestions(self, tag: str) -> [dict]:
+        resp = get_session().get(urljoin(self._base_url, SUGGEST_PATH), params={'q': tag},
+                                 headers=HEADERS, timeout=self._timeout)
+        resp.raise_for_status()
+        suggestions = resp.json()
+        return [s for s in suggestions if s.get('type', 'movie') == 'movie']
+
+    def _read_subject(self, suggestion: dict) -> DoubanMovieInfo:
+        url = suggestion.get('url')
+        if not url:
+            return suggestion_to_info(suggestion)
+        url = urljoin(self._base_url, url)
+        resp = get_session().get(url, headers=HEADERS, timeout=self._timeout)
+        resp.raise_for_status()
+        return parse_subject_page(resp.text, url, suggestion)
@@ -0,0 +1,108 @@
+from html.parser import HTMLParser
+
+from poster_ocr.vo.douban_movie import DoubanMovieInfo
+
+STAFF_SEPARATOR = ' / '
+
+
+class SubjectPageParser(HTMLParser):
+    """Collect the fields of a douban movie subject page
+
+    Douban marks them up with RDFa, e.g. ``property="v:itemreviewed"`` for
+    the title or ``rel="v:directedBy"`` for directors, so we only need to
+    track which marked element we are in.
+    """
+    _PROPERTIES = {
+        'v:itemreviewed': 'title',
+        'v:initialReleaseDate': 'dates',
+        'v:average': 'rate',
+        'v:genre': 'genres',
+        'v:summary': 'summary',
+    }
+    _RELS = {
+        'v:directedBy': 'directors',
+        'v:starring': 'actors',
+    }
+
+    def __init__(self):
+        super(SubjectPageParser, self).__init__(convert_charrefs=True)
+        self.fields = {'title': [], 'dates': [], 'rate': [], 'genres': [], 'summary': [],
+                       'directors': [], 'actors': []}
+        self.image = ''
+        self._current = None
+        self._depth = 0
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._current is not None:
+            self._depth += 1
+            return
+        attrs = dict(attrs)
+        if tag == 'img' and attrs.get('rel') == 'v:image':
+            self.image = attrs.get('src') or ''
+            return
+        field = self._PROPERTIES.get(attrs.get('property')) or self._RELS.get(attrs.get('rel'))
+        if field is not None:
+            self._current = field
+            self._depth = 0
+            self._text = []
+
+    def handle_endtag(self, tag):
+        if self._current is None:
+            return
+        if self._depth > 0:
+            self._depth -= 1
+            return
+        text = ' '.join(''.join(self._text).split())
+        if text:
+            self.fields[self._current].append(text)
+        self._current = None
+
+    def handle_data(self, data):
+        if self._current is not None:
+            self._text.append(data)
+
+
+def parse_subject_page(html: str, url='', fallback: dict = None) -> DoubanMovieInfo:
+    """Build a DoubanMovieInfo from a subject page
+
+    :param fallback: Suggestion entry of the subject, fills fields missing on the page
+    """
+    fallback = fallback or {}
+    parser = SubjectPageParser()
+    parser.feed(html)
+    parser.close()
+    fields = parser.fields
+
+    title = fields['title'][0] if fields['title'] else fallback.get('title', '')
+    staffs = STAFF_SEPARATOR.join(fields['directors'] + fields['actors'][:3])
+    photo_url = parser.image or fallback.get('img', '')
+    show_time = STAFF_SEPARATOR.join(fields['dates']) or fallback.get('year', '')
+    rate = fields['rate'][0] if fields['rate'] else ''
+    other_des = {
+        'url': url,
+        'genres': fields['genres'],
+        'summary': fields['summary'][0] if fields['summary'] else '',
+    }
+    return DoubanMovieInfo(title, staffs, photo_url, show_time, rate, other_des)
+
+
+def suggestion_to_info(suggestion: dict, partial=False) -> DoubanMovieInfo:
+    """DoubanMovieInfo from a subject_suggest entry alone, when its page can not be read
+
+    :param partial: The page exists but reading it failed, see is_partial()
+    """
+    title = suggestion.get('title', '')
+    sub_title = suggestion.get('sub_title')
+    if sub_title and sub_title != title:
+        title = '{} {}'.format(title, sub_title)
+    other_des = {'url': suggestion.get('url', '')}
+    if partial:
+        other_des['partial'] = True
+    return DoubanMovieInfo(title, '', suggestion.get('img', ''), suggestion.get('year', ''), '', other_des)
+
+
+def is_partial(info: DoubanMovieInfo) -> bool:
+    """Whether info lacks fields of a subject page which could not be read
+    """
+    return bool(info.description_display.get('partial'))
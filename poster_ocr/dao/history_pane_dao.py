@@ -1,8 +1,156 @@
+import os
+import sqlite3
+import threading
+
 from poster_ocr.vo.history_item import HistoryItemInfo
 
 
+def default_db_path() -> str:
+    filepath = os.path.abspath(__file__)
+    dirname = os.path.dirname(filepath)
+    return os.path.normpath(os.path.join(dirname, '../../data/history.sqlite3'))
+
+
+_SQL_CREATE = """
+CREATE TABLE IF NOT EXISTS history (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id      TEXT NOT NULL,
+    cover_dir    TEXT NOT NULL,
+    cover_title  TEXT NOT NULL DEFAULT '',
+    history_time REAL NOT NULL,
+    UNIQUE (user_id, cover_dir)
+)"""
+_SQL_CREATE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS history_user_time ON history (user_id, history_time)",
+    "CREATE INDEX IF NOT EXISTS history_cover_dir ON history (cover_dir)",
+)
+
+_COLUMNS = "cover_dir, cover_title, history_time"
+
+# Statements are kept constant so sqlite3 reuses their prepared form from its statement cache
+_SQL_SELECT_ASC = ("SELECT " + _COLUMNS + " FROM history WHERE user_id = ? "
+                   "ORDER BY history_time ASC, id ASC LIMIT ? OFFSET ?")
+_SQL_SELECT_DESC = ("SELECT " + _COLUMNS + " FROM history WHERE user_id = ? "
+                    "ORDER BY history_time DESC, id DESC LIMIT ? OFFSET ?")
+# Keyset pages, resuming after the (history_time, id) of the last record read
+_SQL_PAGE_ASC = ("SELECT id, " + _COLUMNS + " FROM history WHERE user_id = ? "
+                 "AND (history_time > ? OR (history_time = ? AND id > ?)) "
+                 "ORDER BY history_time ASC, id ASC LIMIT ?")
+_SQL_PAGE_DESC = ("SELECT id, " + _COLUMNS + " FROM history WHERE user_id = ? "
+                  "AND (history_time < ? OR (history_time = ? AND id < ?)) "
+                  "ORDER BY history_time DESC, id DESC LIMIT ?")
+_SQL_SELECT_RANGE = ("SELECT " + _COLUMNS + " FROM history WHERE user_id = ? "
+                     "AND history_time >= ? AND history_time < ? "
+                     "ORDER BY history_time ASC, id ASC LIMIT ? OFFSET ?")
+_SQL_SELECT_COVER = "SELECT user_id, " + _COLUMNS + " FROM history WHERE cover_dir = ?"
+_SQL_COUNT = "SELECT COUNT(*) FROM history WHERE user_id = ?"
+_SQL_UPSERT = ("INSERT INTO history (user_id, cover_dir, cover_title, history_time) VALUES (?, ?, ?, ?) "
+               "ON CONFLICT (user_id, cover_dir) DO UPDATE SET "
+               "cover_title = excluded.cover_title, history_time = excluded.history_time")
+_SQL_DELETE = "DELETE FROM history WHERE user_id = ? AND cover_dir = ?"
+_SQL_DELETE_USER = "DELETE FROM history WHERE user_id = ?"
+
+
+def _to_info(row) -> HistoryItemInfo:
+    return HistoryItemInfo(row[0], row[1], row[2])
+
+
 class HistoryInfoDao:
-    @staticmethod
-    def query_history_info(user_id) -> [HistoryItemInfo]:
-        # TODO
-        pass
+    """History records of every user, stored in SQLite
+
+    The database runs in WAL mode so readers never wait for a writer, and
+    records are indexed by (user_id, history_time) for paging and by
+    cover_dir for lookups from a file. A negative limit means no limit.
+
+    A dao can be shared between threads.
+    """
+
+    def __init__(self, db_path=None):
+        self._db_path = db_path or default_db_path()
+        if self._db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self._db_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(_SQL_CREATE)
+            for sql in _SQL_CREATE_INDEXES:
+                self._conn.execute(sql)
+
+    @property
+    def db_path(self) -> str:
+        return self._db_path
+
+    def query_history_info(self, user_id, offset=0, limit=-1, newest_first=False) -> [HistoryItemInfo]:
+        """History of user ordered by time, one page of it if limit is given
+        """
+        sql = _SQL_SELECT_DESC if newest_first else _SQL_SELECT_ASC
+        with self._lock:
+            rows = self._conn.execute(sql, (user_id, limit, offset)).fetchall()
+        return [_to_info(row) for row in rows]
+
+    def query_history_page(self, user_id, after=None, limit=-1, newest_first=False) \
+            -> ([HistoryItemInfo], tuple):
+        """Page of the history of user following the record keyed by after,
+        from the first one if None, and the key of its last record
+
+        Unlike an offset, the key stays right when records before it are
+        deleted or inserted meanwhile. The key is None for an empty page.
+        """
+        if after is None:
+            after = (float('inf'), 0) if newest_first else (float('-inf'), 0)
+        sql = _SQL_PAGE_DESC if newest_first else _SQL_PAGE_ASC
+        with self._lock:
+            rows = self._conn.execute(sql, (user_id, after[0], after[0], after[1], limit)).fetchall()
+        last = (rows[-1][3], rows[-1][0]) if rows else None
+        return [_to_info(row[1:]) for row in rows], last
+
+    def query_history_info_between(self, user_id, start: float, end: float, offset=0, limit=-1) \
+            -> [HistoryItemInfo]:
+        """History of user with start <= history_time < end
+        """
+        with self._lock:
+            rows = self._conn.execute(_SQL_SELECT_RANGE, (user_id, start, end, limit, offset)).fetchall()
+        return [_to_info(row) for row in rows]
+
+    def query_history_info_by_cover(self, cover_dir: str) -> [(str, HistoryItemInfo)]:
+        """Every (user_id, info) recorded for cover_dir
+        """
+        with self._lock:
+            rows = self._conn.execute(_SQL_SELECT_COVER, (cover_dir,)).fetchall()
+        return [(row[0], _to_info(row[1:])) for row in rows]
+
+    def count_history_info(self, user_id) -> int:
+        with self._lock:
+            return self._conn.execute(_SQL_COUNT, (user_id,)).fetchone()[0]
+
+    def insert_history_info(self, user_id, info: HistoryItemInfo):
+        """Insert info, or update title and time if user already has cover_dir
+        """
+        self.insert_history_infos(user_id, [info])
+
+    def insert_history_infos(self, user_id, infos: [HistoryItemInfo]):
+        """Insert many infos in one transaction
+        """
+        params = [(user_id, info.cover_dir, info.cover_title or '', info.history_time) for info in infos]
+        with self._lock, self._conn:
+            self._conn.executemany(_SQL_UPSERT, params)
+
+    def delete_history_info(self, user_id, cover_dir: str):
+        self.delete_history_infos(user_id, [cover_dir])
+
+    def delete_history_infos(self, user_id, cover_dirs: [str]):
+        """Delete many records in one transaction
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(_SQL_DELETE, [(user_id, cover_dir) for cover_dir in cover_dirs])
+
+    def clear_history_info(self, user_id):
+        with self._lock, self._conn:
+            self._conn.execute(_SQL_DELETE_USER, (user_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
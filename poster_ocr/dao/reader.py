@@ -0,0 +1,117 @@
+"""
+readers
+~~~~~~~
+
+Readers hand out items one by one and fetch them page by page from a
+storage or a remote source behind the scene. They are what
+``gui.util.helpers.ReaderFetchMoreMixin`` reads from.
+
+A reader has three attributes
+
+1. count:    total number of items, None while unknown
+2. offset:   number of items read so far
+3. is_async: whether it is iterated with ``async for``
+"""
+
+from collections import deque
+
+DEFAULT_PAGE_SIZE = 30
+
+
+class SequentialReader:
+    """Iterate over items returned by ``read_page(offset, limit)``
+
+    A page shorter than page_size marks the end of the source, count is then
+    known even if it was not given.
+    """
+    is_async = False
+
+    def __init__(self, read_page, count=None, page_size=DEFAULT_PAGE_SIZE):
+        self._read_page = read_page
+        self._page_size = page_size
+        self._buffer = deque()
+        self._read_pos = 0
+        self._exhausted = False
+
+        self.count = count
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._buffer and not self._exhausted:
+            self._fill()
+        if not self._buffer:
+            self.count = self.offset
+            raise StopIteration
+        self.offset += 1
+        return self._buffer.popleft()
+
+    def _fill(self):
+        page = self._read_page(self._read_pos, self._page_size)
+        self._read_pos += len(page)
+        self._buffer.extend(page)
+        if len(page) < self._page_size:
+            self._exhausted = True
+            self.count = self._read_pos
+
+
+class AsyncSequentialReader(SequentialReader):
+    """Like SequentialReader, but read_page is a coroutine function
+    """
+    is_async = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._buffer and not self._exhausted:
+            page = await self._read_page(self._read_pos, self._page_size)
+            self._read_pos += len(page)
+            self._buffer.extend(page)
+            if len(page) < self._page_size:
+                self._exhausted = True
+                self.count = self._read_pos
+        if not self._buffer:
+            self.count = self.offset
+            raise StopAsyncIteration
+        self.offset += 1
+        return self._buffer.popleft()
+
+
+class HistoryReader(SequentialReader):
+    """History records of a user, read from a HistoryInfoDao page by page
+
+    Pages resume after the last record read rather than at an offset, so
+    records deleted while the history is scrolled do not make the next page
+    skip any.
+    """
+
+    def __init__(self, dao, user_id, page_size=DEFAULT_PAGE_SIZE, newest_first=True):
+        self._after = None
+
+        def read_page(_, limit):
+            page, last = dao.query_history_page(user_id, self._after, limit, newest_first)
+            if last is not None:
+                self._after = last
+            return page
+
+        super(HistoryReader, self).__init__(read_page, count=dao.count_history_info(user_id), page_size=page_size)
+
+
+class SearchResultReader(SequentialReader):
+    """Crawled DoubanMovieInfo results, from a list or any iterable
+    """
+
+    def __init__(self, results, page_size=DEFAULT_PAGE_SIZE):
+        if isinstance(results, (list, tuple)):
+            results = list(results)
+            super(SearchResultReader, self).__init__(
+                lambda offset, limit: results[offset:offset + limit],
+                count=len(results), page_size=page_size)
+        else:
+            iterator = iter(results)
+            super(SearchResultReader, self).__init__(
+                lambda _, limit: [item for _, item in zip(range(limit), iterator)],
+                page_size=page_size)
@@ -1,9 +1,11 @@
 from PyQt5 import QtWidgets
 from PyQt5.QtCore import Qt, pyqtSignal, QSize
 from PyQt5.QtGui import QIcon, QPixmap
-from PyQt5.QtWidgets import QWidget, QHBoxLayout, QListWidget, QListWidgetItem
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QListWidget, QListWidgetItem, QFileDialog, QProgressDialog
 
 from gui.theme import read_qss_resource, get_icon_resource
+from poster_ocr.dao.history_pane_dao import HistoryInfoDao
+from poster_ocr.dao.reader import HistoryReader
 from poster_ocr.gui.result_display_widget import ResDisplayWidget
 from poster_ocr.gui.right_panel import RightPanel
 from poster_ocr.vo.douban_movie import DoubanMovieInfo
@@ -11,10 +13,13 @@ from poster_ocr.vo.history_item import HistoryItemInfo
 
 ICON_SIZE = QSize(55, 55)
 
+DEFAULT_USER_ID = 'default'
+
 
 class ClientWidget(QWidget):
-    crawl_for_listed_tags_needed = pyqtSignal([str])
-    """Invoke display_douban_results() to display douban results
+    crawl_for_listed_tags_needed = pyqtSignal(list)
+    """Invoke display_douban_results() to display douban results,
+    or clear_douban_results() then append_douban_results() to stream them
     
     You can also dump current results by invoking dump_current_results()
     """
@@ -34,9 +39,21 @@ class ClientWidget(QWidget):
     
     and invoke get_all_history_items() to get all history items for
     current user
+    
+    If the client is given a HistoryInfoDao, history records are loaded from
+    and saved to it without any outside handler
+    """
+
+    batch_ocr_for_folder_needed = pyqtSignal(str)
+    """Invoke show_batch_progress() while the folder is being recognized,
+    and finish_batch_progress() once done
+    
+    batch_ocr_cancel_needed is emitted if the user cancels the batch
     """
 
-    def __init__(self):
+    batch_ocr_cancel_needed = pyqtSignal()
+
+    def __init__(self, history_dao: HistoryInfoDao = None, user_id=DEFAULT_USER_ID):
         super(ClientWidget, self).__init__()
         self.setObjectName("ClientWidget")
 
@@ -50,7 +67,13 @@ class ClientWidget(QWidget):
 
         self.right_widget = RightPanel(self)
 
+        self._history_dao = history_dao
+        self._user_id = user_id
+
+        self._batch_progress = None
+
         self._set_ui()
+        self._bind_signals()
 
     def _set_ui(self):
         self._layout = QHBoxLayout(self)
@@ -63,8 +86,8 @@ class ClientWidget(QWidget):
         self.left_widget.setIconSize(ICON_SIZE)
         self.left_widget.setViewMode(QtWidgets.QListView.IconMode)
 
-        icon_url_list = ['cancel.png', 'cloud-computing.png', 'info.png']
-        item_str_list = ['Back', 'Recognize', 'Load History']
+        icon_url_list = ['cancel.png', 'cloud-computing.png', 'info.png', 'play-button.png']
+        item_str_list = ['Back', 'Recognize', 'Load History', 'Batch OCR']
 
         for icon_url, item_str in zip(icon_url_list, item_str_list):
             item = QListWidgetItem()
@@ -96,6 +119,9 @@ class ClientWidget(QWidget):
     def _bind_signals(self):
         self.left_widget.currentRowChanged.connect(self.on_func_button_pushed)
         self.right_widget.cover_ocr_needed.connect(self.on_ocr_needed)
+        self.right_widget.history_panel.history_item_deleted.connect(self._on_history_item_deleted)
+        if self._history_dao is not None:
+            self.show_history_records_for_current_user_needed.connect(self.load_history_from_dao)
 
     @staticmethod
     def warning(info):
@@ -120,7 +146,7 @@ class ClientWidget(QWidget):
             """Call for crawling"""
             tag_list = self.right_widget.flow_tag_panel.get_selected_tags()
             if tag_list:
-                self.crawl_for_listed_tags_needed.emit(tag_list)
+                self.crawl_for_listed_tags_needed.emit(list(tag_list))
             else:
                 self.warning("Choose some tags you're interested in please.")
                 self.right_widget.flow_tag_panel.shine()
@@ -129,17 +155,66 @@ class ClientWidget(QWidget):
             """Load history records for current user"""
             self.show_history_records_for_current_user_needed.emit()
 
+        elif index == 3:
+            """Recognize every poster in a folder"""
+            folder = QFileDialog.getExistingDirectory(self, 'Choose a folder of posters')
+            if folder:
+                self.batch_ocr_for_folder_needed.emit(folder)
+
     """         History Pane Concerned Methods          """
     def show_history(self, info_list: [HistoryItemInfo]):
         self.right_widget.history_panel.load_all_history_items(info_list)
 
     def add_new_record_for_user(self, info: HistoryItemInfo):
         self.right_widget.history_panel.try_add_item(info, True)
+        if self._history_dao is not None:
+            self._history_dao.insert_history_info(self._user_id, info)
+
+    def load_history_from_dao(self):
+        """Show history of current user, newest first, read page by page as the panel scrolls
+        """
+        reader = HistoryReader(self._history_dao, self._user_id)
+        self.right_widget.history_panel.load_history_reader(reader)
+
+    def _on_history_item_deleted(self, cover_dir: str):
+        if self._history_dao is not None:
+            self._history_dao.delete_history_info(self._user_id, cover_dir)
 
     def get_all_history_items(self) -> [HistoryItemInfo]:
         return self.right_widget.history_panel.get_all_history_items()
+
+    def show_cover_regions(self, cover_dir: str, regions: [tuple]):
+        self.right_widget.history_panel.set_cover_regions(cover_dir, regions)
     """      End for History Pane Concerned Methods     """
 
+    """             Batch OCR Concerned Methods         """
+    def show_batch_progress(self, recognized: int, failed: int, found: int):
+        if self._batch_progress is None:
+            self._batch_progress = QProgressDialog('Recognizing posters...', 'Cancel', 0, 0, self)
+            self._batch_progress.setWindowTitle('Batch OCR')
+            self._batch_progress.setMinimumDuration(0)
+            self._batch_progress.setAutoClose(False)
+            self._batch_progress.setAutoReset(False)
+            self._batch_progress.canceled.connect(self.batch_ocr_cancel_needed)
+        self._batch_progress.setMaximum(max(found, 1))
+        self._batch_progress.setValue(recognized + failed)
+        self._batch_progress.setLabelText('Recognized {} of {} posters found, {} failed'.format(
+            recognized, found, failed))
+
+    def finish_batch_progress(self, recognized: int, failed: int):
+        """Keep the progress dialog open with the summary until the user closes it
+        """
+        if self._batch_progress is None:
+            return
+        dialog, self._batch_progress = self._batch_progress, None
+        dialog.canceled.disconnect(self.batch_ocr_cancel_needed)
+        dialog.canceled.connect(dialog.deleteLater)
+        dialog.setMaximum(1)
+        dialog.setValue(1)
+        dialog.setCancelButtonText('Close')
+        dialog.setLabelText('Recognized {} posters, {} failed.'.format(recognized, failed))
+    """         End for Batch OCR Concerned Methods     """
+
     """         Flow Tag Pane Concerned Methods         """
     def add_new_tags(self, tags: [str]):
         for tag in tags:
@@ -156,6 +231,14 @@ class ClientWidget(QWidget):
     def display_douban_results(self, lx: [DoubanMovieInfo]):
         self.middle_widget.show_results(lx)
 
+    def clear_douban_results(self):
+        self.middle_widget.clear_results()
+
+    def append_douban_results(self, lx: [DoubanMovieInfo]):
+        """Append results streamed by a crawl, call clear_douban_results() before a new crawl
+        """
+        self.middle_widget.append_results(lx)
+
     def dump_current_results(self) -> [DoubanMovieInfo]:
         return self.middle_widget.dump_results()
     """  End for Result Display Pane Concerned Methods  """
@@ -1,39 +1,52 @@
-from PyQt5.QtCore import QUrl, QPoint
+from PyQt5.QtCore import QPoint, QSize, Qt
 from PyQt5.QtGui import QPixmap
-from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
 
 import logging
+from functools import partial
 
 from PyQt5.QtSvg import QSvgWidget
 
+from poster_ocr.cache.poster_cache import PosterCache
 from poster_ocr.gui.animation.svg_icon import LoadingIcon
 from poster_ocr.gui.panel.cover.animation_wrapper import BubbleWrapperWidget
 from poster_ocr.gui.panel.cover.cover_label import CoverLabel
-from poster_ocr.gui.util.excpetion import NetworkRequestingErrorException
+from poster_ocr.gui.panel.cover.poster_downloader import PosterDownloader
+from poster_ocr.gui.util.image_decoder import get_image_decoder
 
 
 class Render:
-    def __init__(self, cache_path="../../../../cache/", parent=None):
-        self._parent = parent
+    """Pop up bubbles displaying posters of crawled movies
 
-        self._existing_bubbles = {}
+    Posters are looked up in a PosterCache first, and only downloaded on miss
+    by a PosterDownloader shared with anyone who wants to warm the cache.
+    """
 
-        self._na_manager = QNetworkAccessManager()
-        self._na_manager.finished.connect(self.handle_response)
+    def __init__(self, cache: PosterCache = None, parent=None):
+        self._parent = parent
 
-        self._current_filename = []
-        self._current_url = []
-        self._load_started = False
+        self._existing_bubbles = {}
 
         self._cover_width = 250
         self._cover_height = 360
 
-        self._cache_path = cache_path
+        self._cache = cache if cache is not None else PosterCache()
+
+        self._downloader = PosterDownloader(self._cache)
+        self._downloader.downloaded.connect(self.handle_download)
+        self._downloader.failed.connect(self.handle_failure)
+
+    @property
+    def cache(self) -> PosterCache:
+        return self._cache
+
+    @property
+    def downloader(self) -> PosterDownloader:
+        return self._downloader
 
     def pop_new_bubble(self, pos: QPoint, url: str):
         """Call all other existing bubbles to fade away and create a new one
         """
-        for k in self._existing_bubbles.keys():
+        for k in list(self._existing_bubbles.keys()):
             item = self._existing_bubbles.pop(k)
             if isinstance(item, BubbleWrapperWidget):
                 item.terminate()
@@ -45,59 +58,40 @@ class Render:
         new_bubble.set_loading(load_widget)
         new_bubble.show()
 
-        try:
-            data_dir = self._cache_path + QUrl(url).fileName()
-            f = open(data_dir)
-            f.close()
-            self.set_cover(url)
-        except FileNotFoundError:
+        data_dir = self._cache.get_path(url)
+        if data_dir is not None:
+            self.set_cover(data_dir, url)
+        else:
             # Start requesting for img
             self.do_request(url)
 
     def do_request(self, url: str):
-        url_obj = QUrl(url)
-
-        self._current_filename.append(self._cache_path + url_obj.fileName())
-        self._current_url.append(url)
-        req = QNetworkRequest(url_obj)
-
-        logging.debug("Start request for {}", url)
-        self._load_started = True
-        self._na_manager.get(req)
-
-    def handle_response(self, reply: QNetworkReply):
-        self._load_started = False
-
-        file_name = self._current_filename.pop(0)
-        url = self._current_url.pop(0)
-        error = reply.error()
-
-        if error == QNetworkReply.NoError:
-            self.save_file(reply.readAll().data(), file_name, url)
-        else:
-            logging.error("Request failed for {}", file_name)
-            raise NetworkRequestingErrorException
-
-        reply.deleteLater()
-        del reply
+        """Download poster at url, repeated requests share the download in flight
+        """
+        self._downloader.fetch(url)
 
-    def save_file(self, data, write_dir, url):
-        if data:
-            f = open(write_dir, 'wb')
-            with f:
-                f.write(data)
+    def handle_download(self, url: str, data_dir: str):
+        # The file was just written, a decode of an earlier version may have failed
+        get_image_decoder().invalidate(data_dir)
+        self.set_cover(data_dir, url)
 
-            if data and write_dir and url:
-                # Graphic is downloaded
-                self.set_cover(write_dir, url)
-        else:
-            logging.error("Data fetching failed {}", write_dir)
+    def handle_failure(self, url: str, reason: str):
+        # The downloader logs every failure, prefetches included, only report covers being waited for
+        if self._existing_bubbles.__contains__(url):
+            logging.warning("Cover for %s can not be shown: %s", url, reason)
 
     def set_cover(self, data_dir, url):
         """Replace SVG placeholder on Bubble with the picture for cover
         """
         if self._existing_bubbles.__contains__(url):
+            pixmap = get_image_decoder().request(data_dir, QSize(self._cover_width, self._cover_height),
+                                                 Qt.KeepAspectRatioByExpanding, partial(self._show_pixmap, url))
+            if pixmap is not None:
+                self._show_pixmap(url, pixmap)
+
+    def _show_pixmap(self, url, pixmap: QPixmap):
+        if self._existing_bubbles.__contains__(url) and not pixmap.isNull():
             bubble = self._existing_bubbles[url]
             assert isinstance(bubble, BubbleWrapperWidget)
-            cover_label = CoverLabel(self._cover_width, self._cover_height, bubble, QPixmap(data_dir))
+            cover_label = CoverLabel(self._cover_width, self._cover_height, bubble, pixmap)
             bubble.switch_label(cover_label)
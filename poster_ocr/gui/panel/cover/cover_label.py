@@ -1,9 +1,15 @@
+import asyncio
+import logging
+
 from PyQt5.QtCore import Qt, QRect
 from PyQt5.QtGui import QPainter, QPixmap, QBrush
 from PyQt5.QtWidgets import QLabel, QSizePolicy
 
+from poster_ocr.gui.util import aio
 from poster_ocr.vo.douban_movie import DoubanMovieInfo
 
+logger = logging.getLogger(__name__)
+
 COVER_LABEL_RADIUS = 3
 
 
@@ -12,6 +18,7 @@ class CoverLabel(QLabel):
         super().__init__(parent=parent)
 
         self._pixmap = pixmap
+        self._loading_task = None
         self.setMinimumSize(width, height)
         self.setMaximumSize(width, height)
         self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.MinimumExpanding)
@@ -29,7 +36,10 @@ class CoverLabel(QLabel):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing)
         painter.setRenderHint(QPainter.SmoothPixmapTransform)
-        scaled_pixmap = self._pixmap.scaledToWidth(self.width(), mode=Qt.SmoothTransformation)
+        if self._pixmap.width() == self.width():
+            scaled_pixmap = self._pixmap
+        else:
+            scaled_pixmap = self._pixmap.scaledToWidth(self.width(), mode=Qt.SmoothTransformation)
         size = scaled_pixmap.size()
         painter.setBrush(QBrush(scaled_pixmap))
         painter.setPen(Qt.NoPen)
@@ -43,10 +53,31 @@ class CoverLabel(QLabel):
         painter.end()
 
     async def show_cover(self, movie_info: DoubanMovieInfo):
-        pixmap = await movie_info.load_photo()
+        try:
+            pixmap = await movie_info.load_photo()
+        except asyncio.CancelledError:
+            raise
+        except Exception:  # noqa
+            logger.exception('load photo for %s failed', movie_info.photo_url)
+            return
         if not pixmap.isNull():
             self.show_pixmap(pixmap)
 
+    def load_cover(self, movie_info: DoubanMovieInfo):
+        """Show the photo of movie_info once loaded, cancelling any previous loading
+        """
+        self.cancel_loading()
+        self._loading_task = aio.create_task(self.show_cover(movie_info))
+
+    def cancel_loading(self):
+        if self._loading_task is not None and not self._loading_task.done():
+            self._loading_task.cancel()
+        self._loading_task = None
+
+    def hideEvent(self, a0) -> None:
+        super().hideEvent(a0)
+        self.cancel_loading()
+
     def resizeEvent(self, a0) -> None:
         super().resizeEvent(a0)
         self.updateGeometry()
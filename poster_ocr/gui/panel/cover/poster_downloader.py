@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import logging
+from functools import partial
+
+from PyQt5.QtCore import QObject, QTimer, QUrl, pyqtSignal
+from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkReply, QNetworkRequest
+
+from poster_ocr.cache.poster_cache import PosterCache
+from poster_ocr.net.rate_limiter import Priority, RateLimiter, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = frozenset([
+    QNetworkReply.RemoteHostClosedError,
+    QNetworkReply.TimeoutError,
+    QNetworkReply.TemporaryNetworkFailureError,
+    QNetworkReply.NetworkSessionFailedError,
+    QNetworkReply.ProxyTimeoutError,
+    QNetworkReply.InternalServerError,
+    QNetworkReply.ServiceUnavailableError,
+    QNetworkReply.UnknownServerError,
+])
+
+
+class _DownloadJob:
+    def __init__(self, url: str, priority: Priority):
+        self.url = url
+        self.host = QUrl(url).host()
+        self.priority = priority
+        self.queued = False
+        self.attempts = 0
+        self.ticket = None
+        self.reply = None
+        self.timer = None
+        self.timed_out = False
+        self.cancelled = False
+
+
+class PosterDownloader(QObject):
+    """Download posters into a PosterCache, one job per url
+
+    Requests for an url already queued or in flight are coalesced into the
+    existing job, raising its priority if needed. At most ``max_per_host``
+    replies are in flight for one host, the rest wait in a priority queue of
+    that host, FIFO within the same priority. ``reserved_per_host`` of those
+    slots are kept for interactive requests, so prefetching never delays a
+    click by more than one reply. A reply running longer than
+    ``timeout`` ms is aborted, and transient failures are retried up to
+    ``max_retries`` times with exponential backoff starting at ``backoff`` ms.
+
+    A job holding a slot still waits for a token of the RateLimiter shared
+    with every other outbound request before its reply starts.
+
+    Every QNetworkReply is bound to its own job, so replies may finish in
+    any order.
+    """
+    downloaded = pyqtSignal(str, str)
+    """Emitted with (url, path of the cached file)"""
+
+    failed = pyqtSignal(str, str)
+    """Emitted with (url, error description) once retries are exhausted"""
+
+    def __init__(self, cache: PosterCache, max_per_host=4, reserved_per_host=1, timeout=15000, max_retries=3,
+                 backoff=500, limiter: RateLimiter = None, parent=None):
+        super(PosterDownloader, self).__init__(parent)
+
+        self._cache = cache
+        self._max_per_host = max_per_host
+        self._reserved_per_host = min(reserved_per_host, max_per_host - 1)
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._limiter = limiter if limiter is not None else get_rate_limiter()
+
+        self._na_manager = QNetworkAccessManager(self)
+
+        self._jobs = {}
+        self._waiting = {}
+        self._active = {}
+        self._seq = itertools.count()
+
+    @property
+    def limiter(self) -> RateLimiter:
+        return self._limiter
+
+    def fetch(self, url: str, priority=Priority.INTERACTIVE) -> bool:
+        """Download poster at url unless it is already being downloaded
+
+        :return: False if the request was coalesced into an existing job
+        """
+        job = self._jobs.get(url)
+        if job is not None:
+            if priority < job.priority:
+                job.priority = priority
+                if job.queued:
+                    # The stale heap entry is skipped when popped
+                    self._enqueue(job)
+                elif job.ticket is not None:
+                    job.ticket.cancel()
+                    self._request_token(job)
+            return False
+        job = _DownloadJob(url, priority)
+        self._jobs[url] = job
+        self._enqueue(job)
+        return True
+
+    def cancel(self, url: str, priority=Priority.INTERACTIVE, abort_running=True) -> bool:
+        """Cancel the job for url if its priority is not above priority
+
+        :param abort_running: Also abort the reply if the job is in flight
+        """
+        job = self._jobs.get(url)
+        if job is None or job.priority < priority:
+            return False
+        if job.reply is not None and not abort_running:
+            return False
+        del self._jobs[url]
+        job.cancelled = True
+        job.queued = False
+        if job.ticket is not None:
+            job.ticket.cancel()
+            job.ticket = None
+            self._active[job.host] -= 1
+            self._pump(job.host)
+        if job.reply is not None:
+            job.reply.abort()
+        return True
+
+    def is_pending(self, url: str) -> bool:
+        return url in self._jobs
+
+    def pending_count(self) -> int:
+        return len(self._jobs)
+
+    def _enqueue(self, job: _DownloadJob):
+        if job.cancelled:
+            return
+        job.queued = True
+        heapq.heappush(self._waiting.setdefault(job.host, []), (job.priority, next(self._seq), job))
+        self._pump(job.host)
+
+    def _pump(self, host: str):
+        queue = self._waiting.get(host)
+        while queue:
+            priority, _, job = queue[0]
+            if not job.queued or priority != job.priority:
+                heapq.heappop(queue)
+                continue
+            limit = self._max_per_host
+            if priority > Priority.INTERACTIVE:
+                limit -= self._reserved_per_host
+            if self._active.get(host, 0) >= limit:
+                break
+            heapq.heappop(queue)
+            job.queued = False
+            self._active[host] = self._active.get(host, 0) + 1
+            self._request_token(job)
+        if not queue:
+            self._waiting.pop(host, None)
+
+    def _request_token(self, job: _DownloadJob):
+        ticket = self._limiter.request(job.url, job.priority, partial(self._start, job))
+        job.ticket = None if ticket.granted else ticket
+
+    def _start(self, job: _DownloadJob):
+        job.ticket = None
+        job.attempts += 1
+        job.timed_out = False
+
+        req = QNetworkRequest(QUrl(job.url))
+        req.setAttribute(QNetworkRequest.FollowRedirectsAttribute, True)
+        logger.debug('Start request for %s, attempt %d', job.url, job.attempts)
+        job.reply = self._na_manager.get(req)
+        job.reply.finished.connect(partial(self._on_finished, job, job.reply))
+
+        job.timer = QTimer(self)
+        job.timer.setSingleShot(True)
+        job.timer.timeout.connect(partial(self._on_timeout, job, job.reply))
+        job.timer.start(self._timeout)
+
+    def _on_timeout(self, job: _DownloadJob, reply: QNetworkReply):
+        if job.reply is reply:
+            job.timed_out = True
+            reply.abort()
+
+    def _on_finished(self, job: _DownloadJob, reply: QNetworkReply):
+        self._active[job.host] -= 1
+        if job.timer is not None:
+            job.timer.stop()
+            job.timer.deleteLater()
+            job.timer = None
+        job.reply = None
+
+        try:
+            if job.cancelled:
+                return
+            error = reply.error()
+            status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+            if error == QNetworkReply.NoError:
+                self._on_succeeded(job, reply.readAll().data())
+            elif self._should_retry(job, error, status):
+                delay = self._backoff * 2 ** (job.attempts - 1)
+                logger.debug('Retry %s in %d ms after error %s', job.url, delay, error)
+                QTimer.singleShot(delay, partial(self._enqueue, job))
+            else:
+                reason = 'timed out' if job.timed_out else reply.errorString()
+                self._on_failed(job, reason)
+        finally:
+            reply.deleteLater()
+            self._pump(job.host)
+
+    def _should_retry(self, job: _DownloadJob, error, status) -> bool:
+        if job.attempts > self._max_retries:
+            return False
+        if job.timed_out or error in RETRYABLE_ERRORS:
+            return True
+        return status is not None and (status == 429 or status >= 500)
+
+    def _on_succeeded(self, job: _DownloadJob, data: bytes):
+        self._jobs.pop(job.url, None)
+        if not data:
+            self._on_failed(job, 'empty response')
+            return
+        try:
+            path = self._cache.put(job.url, data)
+        except OSError as e:
+            self._on_failed(job, str(e))
+        else:
+            self.downloaded.emit(job.url, path)
+
+    def _on_failed(self, job: _DownloadJob, reason: str):
+        self._jobs.pop(job.url, None)
+        logger.error('Request failed for %s: %s', job.url, reason)
+        self.failed.emit(job.url, reason)
@@ -0,0 +1,164 @@
+import os
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt, QVariant
+
+from poster_ocr.gui.util.helpers import ReaderFetchMoreMixin
+from poster_ocr.vo.history_item import HistoryItemInfo
+
+
+class HistoryRole:
+    INFO = Qt.UserRole
+    IS_NEW = Qt.UserRole + 1
+    REGIONS = Qt.UserRole + 2
+
+
+class HistoryListModel(ReaderFetchMoreMixin, QAbstractListModel):
+    """Flat list of HistoryItemInfo, unique by cover_dir
+
+    Items added as new stay flagged by IS_NEW role until mark_seen() is
+    called, the view uses the flag to make them shine.
+
+    With a reader set, rows are fetched from it page by page as the view
+    scrolls down.
+
+    Text regions found on a cover by OCR are exposed by REGIONS role. They
+    are not part of the history records, so they outlive a reload of the
+    rows and are only dropped with the item.
+    """
+
+    def __init__(self, parent=None):
+        super(HistoryListModel, self).__init__(parent)
+        self._reader = None
+        self._fetch_more_step = 30
+        self._is_fetching = False
+
+        self._items = []
+        self._cover_dirs = set()
+        self._new_cover_dirs = set()
+        self._regions = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._items):
+            return QVariant()
+
+        info = self._items[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(info.cover_dir)
+        elif role == Qt.ToolTipRole:
+            return info.cover_dir
+        elif role == HistoryRole.INFO:
+            return info
+        elif role == HistoryRole.IS_NEW:
+            return info.cover_dir in self._new_cover_dirs
+        elif role == HistoryRole.REGIONS:
+            return self._regions.get(info.cover_dir, [])
+        return QVariant()
+
+    def contains(self, cover_dir: str) -> bool:
+        return cover_dir in self._cover_dirs
+
+    def add_item(self, info: HistoryItemInfo, is_new=False) -> bool:
+        if info.cover_dir in self._cover_dirs:
+            return False
+        row = len(self._items)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._items.append(info)
+        self._cover_dirs.add(info.cover_dir)
+        if is_new:
+            self._new_cover_dirs.add(info.cover_dir)
+        self.endInsertRows()
+        return True
+
+    def add_items(self, infos: [HistoryItemInfo], is_new=False) -> int:
+        """Append infos not in the model yet as one block of rows
+
+        :return: Number of rows inserted
+        """
+        fresh = []
+        for info in infos:
+            if info.cover_dir not in self._cover_dirs:
+                self._cover_dirs.add(info.cover_dir)
+                fresh.append(info)
+        if not fresh:
+            return 0
+        row = len(self._items)
+        self.beginInsertRows(QModelIndex(), row, row + len(fresh) - 1)
+        self._items.extend(fresh)
+        if is_new:
+            self._new_cover_dirs.update(info.cover_dir for info in fresh)
+        self.endInsertRows()
+        return len(fresh)
+
+    def set_reader(self, reader):
+        """Replace all rows with items lazily read from reader
+        """
+        self.clear()
+        self._reader = reader
+
+    def on_items_fetched(self, items):
+        self.add_items(items)
+
+    def remove_item(self, cover_dir: str) -> bool:
+        row = self.row_of(cover_dir)
+        if row < 0:
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self._items.pop(row)
+        self._cover_dirs.discard(cover_dir)
+        self._new_cover_dirs.discard(cover_dir)
+        self._regions.pop(cover_dir, None)
+        self.endRemoveRows()
+        return True
+
+    def clear(self):
+        self.beginResetModel()
+        self._reader = None
+        self._is_fetching = False
+        self._items = []
+        self._cover_dirs = set()
+        self._new_cover_dirs = set()
+        self.endResetModel()
+
+    def row_of(self, cover_dir: str) -> int:
+        if cover_dir not in self._cover_dirs:
+            return -1
+        for row, info in enumerate(self._items):
+            if info.cover_dir == cover_dir:
+                return row
+        return -1
+
+    def items(self) -> [HistoryItemInfo]:
+        return list(self._items)
+
+    def has_new_items(self) -> bool:
+        return bool(self._new_cover_dirs)
+
+    def mark_seen(self, cover_dir: str):
+        if cover_dir in self._new_cover_dirs:
+            self._new_cover_dirs.discard(cover_dir)
+            row = self.row_of(cover_dir)
+            if row >= 0:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [HistoryRole.IS_NEW])
+
+    def set_regions(self, cover_dir: str, regions: [tuple]):
+        """Relative (x, y, width, height) boxes of text found on the cover
+        """
+        if regions:
+            self._regions[cover_dir] = list(regions)
+        elif self._regions.pop(cover_dir, None) is None:
+            return
+        row = self.row_of(cover_dir)
+        if row >= 0:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [HistoryRole.REGIONS])
+
+    def new_rows(self) -> [int]:
+        if not self._new_cover_dirs:
+            return []
+        return [row for row, info in enumerate(self._items) if info.cover_dir in self._new_cover_dirs]
@@ -1,34 +1,58 @@
+import os
+import time
+
 from PyQt5 import QtGui
-from PyQt5.QtCore import pyqtSignal, Qt
-from PyQt5.QtWidgets import QListWidget, QListWidgetItem
+from PyQt5.QtCore import pyqtSignal, Qt, QTimer
+from PyQt5.QtWidgets import QListView, QAbstractItemView
 
 from gui.theme import get_icon_resource, read_qss_resource
-from poster_ocr.gui.panel.history.item_widget import ItemWidget
-from poster_ocr.gui.util.excpetion import ListWidgetItemNotMatchedException
+from poster_ocr.gui.panel.history.history_model import HistoryListModel
+from poster_ocr.gui.panel.history.item_delegate import HistoryItemDelegate
 from poster_ocr.vo.history_item import HistoryItemInfo
 
 HISTORY_PANEL_WIDTH = 700
 HISTORY_PANEL_HEIGHT = 500
 
+# Rows inserted at once while bulk loading, and time spent inserting before yielding to the event loop
+LOAD_CHUNK_SIZE = 200
+LOAD_FRAME_BUDGET = 0.008
+
 TESTING = True
 
 
 StyleSheet = read_qss_resource('HistoryItemQSS.qss')
 
 
-class HistoryPanel(QListWidget):
+class HistoryPanel(QListView):
+    """Virtualized view of history items
+
+    Items are rows of a HistoryListModel painted by a HistoryItemDelegate,
+    no widget is created per item.
+    """
     cover_ocr_needed = pyqtSignal(str)
 
+    history_item_deleted = pyqtSignal(str)
+    """Emitted with cover_dir when the user deleted an item"""
+
+    history_loaded = pyqtSignal()
+    """Emitted once load_all_history_items() inserted every item"""
+
     def __init__(self, parent=None):
         super(HistoryPanel, self).__init__(parent=parent)
         self.setObjectName("HistoryPanel")
         self.setMinimumSize(HISTORY_PANEL_WIDTH, HISTORY_PANEL_HEIGHT)
 
         # The same as FlowLayout
-        self.setFrameShape(QListWidget.NoFrame)
-        self.setFlow(QListWidget.LeftToRight)
+        self.setFrameShape(QListView.NoFrame)
+        self.setFlow(QListView.LeftToRight)
         self.setWrapping(True)
-        self.setResizeMode(QListWidget.Adjust)
+        self.setResizeMode(QListView.Adjust)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setMouseTracking(True)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(LOAD_CHUNK_SIZE)
 
         self._setup_ui()
         self.setVisible(True)
@@ -40,7 +64,18 @@ class HistoryPanel(QListWidget):
         fit_pixmap = pix_img.scaled(12, 12, transformMode=Qt.SmoothTransformation)
         self._rec_icon = QtGui.QIcon(fit_pixmap)
 
-        self._cover_items_map = {}
+        self._model = HistoryListModel(self)
+        self.setModel(self._model)
+        self._delegate = HistoryItemDelegate(self._rec_icon, self._del_icon, self)
+        self.setItemDelegate(self._delegate)
+
+        self._pending_infos = []
+        self._pending_pos = 0
+        self._load_timer = QTimer(self)
+        self._load_timer.setSingleShot(True)
+        self._load_timer.setInterval(0)
+
+        self._bind_signals()
 
         if TESTING:
             pass
@@ -51,71 +86,105 @@ class HistoryPanel(QListWidget):
 
         self.setStyleSheet(StyleSheet)
 
+    def _bind_signals(self):
+        self._delegate.cover_ocr_needed.connect(self._call_for_ocr)
+        self._delegate.deleting_needed.connect(self._delete_item)
+        self._delegate.cover_clicked.connect(self._open_cover)
+        self._delegate.item_pressed.connect(self._model.mark_seen)
+        self._load_timer.timeout.connect(self._load_next_chunks)
+        self.verticalScrollBar().rangeChanged.connect(self._fill_viewport)
+
     def try_add_item(self, info: HistoryItemInfo, is_new):
         """Try to add a history item into History Panel
 
         :param info:    Info VO Entity for History Item
-        :param is_new:  Whether info is new to the panel, if true, its item widget will shine
+        :param is_new:  Whether info is new to the panel, if true, its item will shine
         """
-        if not self._cover_items_map.__contains__(info.cover_dir):
-            self._do_add_item(info.cover_dir, info.cover_title, info.history_time, is_new)
+        if self._model.add_item(info, is_new):
+            if is_new:
+                self._delegate.start_glow()
         else:
             print(info.cover_dir + " already been added before")
 
-    def _do_add_item(self, cover_dir: str, cover_title, history_time, is_new):
-        item = QListWidgetItem(self)
-        widget = ItemWidget(cover_dir, cover_title, history_time,
-                            self._rec_icon, self._del_icon, item,
-                            is_shiny=is_new, parent=self)
-        widget.deleting_needed.connect(self._delete_item)
-        widget.cover_ocr_needed.connect(self._call_for_ocr)
-        item.setSizeHint(widget.sizeHint())
-        self.setItemWidget(item, widget)
-        self._cover_items_map[cover_dir] = widget
-
-        self.repaint()
+    def set_cover_regions(self, cover_dir: str, regions: [tuple]):
+        """Outline text regions found by OCR over the cover of cover_dir
+        """
+        self._model.set_regions(cover_dir, regions)
 
     def _call_for_ocr(self, cover_dir: str):
         self.cover_ocr_needed.emit(cover_dir)
 
-    def _delete_item(self, cover_dir: str, item: QListWidgetItem):
-        target = self._cover_items_map.pop(cover_dir)
-
-        if target is not self.itemWidget(item):
-            raise ListWidgetItemNotMatchedException
-        else:
-            self._do_delete_item(item)
+    def _delete_item(self, cover_dir: str):
+        if self._model.remove_item(cover_dir):
+            self.history_item_deleted.emit(cover_dir)
 
-    def _do_delete_item(self, item):
-        self.takeItem(self.row(item))
-        self.removeItemWidget(item)
-        del item
+    @staticmethod
+    def _open_cover(cover_dir: str):
+        """Open Picture with os explorer.exe by Windows
+        """
+        os.system('explorer.exe "{}"'.format(cover_dir))
 
     def _do_clear_items(self):
-        """Destroy all item widgets and clear cover map
+        """Remove all items
         """
-        for _ in range(self.count()):
-            item = self.takeItem(0)
-            self.removeItemWidget(item)
-            del item
-        self._cover_items_map = {}
+        self._model.clear()
 
     def get_all_history_items(self) -> [HistoryItemInfo]:
         """Get all infos as a list for all items in the panel
         """
-        res = []
-
-        for k, v in self._cover_items_map.items():
-            if isinstance(v, ItemWidget):
-                res.append(v.get_history_item_info())
-
-        return res
+        return self._model.items()
 
     def load_all_history_items(self, info_list: [HistoryItemInfo]):
         """Load and display all history items.
 
+        Items are inserted in chunks with repaints suspended, and the event
+        loop runs between two frames worth of chunks, so a long history never
+        blocks input. history_loaded is emitted when done. A call made while
+        a previous load is running queues its items after the pending ones.
+
         :param info_list: List contains info for all history items to display
         """
-        for info in info_list:
-            if isinstance(info, HistoryItemInfo):
-                self.try_add_item(info, False)
+        self._pending_infos.extend(info for info in info_list if isinstance(info, HistoryItemInfo))
+        self._load_timer.start()
+
+    def load_history_reader(self, reader):
+        """Replace all items with items read lazily from reader as the user scrolls
+        """
+        self.cancel_loading()
+        self._model.set_reader(reader)
+        self._fill_viewport()
+
+    def _fill_viewport(self, *_):
+        """Fetch pages until the viewport is covered, later pages come with scrolling
+        """
+        if self._model.canFetchMore() and self.verticalScrollBar().maximum() == 0:
+            self._model.fetchMore()
+
+    def cancel_loading(self):
+        """Drop items not inserted yet by load_all_history_items()
+        """
+        self._pending_infos = []
+        self._pending_pos = 0
+        self._load_timer.stop()
+
+    def _load_next_chunks(self):
+        deadline = time.perf_counter() + LOAD_FRAME_BUDGET
+        self.setUpdatesEnabled(False)
+        try:
+            while self._pending_pos < len(self._pending_infos) and time.perf_counter() < deadline:
+                end = self._pending_pos + LOAD_CHUNK_SIZE
+                self._model.add_items(self._pending_infos[self._pending_pos:end])
+                self._pending_pos = end
+        finally:
+            self.setUpdatesEnabled(True)
+
+        if self._pending_pos < len(self._pending_infos):
+            self._load_timer.start()
+        else:
+            self._pending_infos = []
+            self._pending_pos = 0
+            self.history_loaded.emit()
+
+    def leaveEvent(self, e) -> None:
+        super(HistoryPanel, self).leaveEvent(e)
+        self._delegate.clear_hover()
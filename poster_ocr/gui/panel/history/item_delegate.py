@@ -0,0 +1,244 @@
+import os
+import time
+from enum import IntEnum
+from functools import partial
+
+from PyQt5.QtCore import Qt, pyqtSignal, QSize, QRect, QRectF, QEvent, QVariantAnimation, QPersistentModelIndex
+from PyQt5.QtGui import QColor, QFont, QPainter, QIcon, QPixmap, QPen
+from PyQt5.QtWidgets import QStyledItemDelegate, QAbstractItemView
+
+from poster_ocr.gui.panel.history.history_model import HistoryRole
+from poster_ocr.gui.util.image_decoder import get_image_decoder
+
+COVER_WIDTH = 220
+COVER_HEIGHT = 308
+ITEM_HEIGHT = 380
+
+ITEM_SIZE = QSize(COVER_WIDTH + 5, ITEM_HEIGHT + 5)
+ITEM_RADIUS = 5
+
+TEXT_HEIGHT = 18
+BUTTON_HEIGHT = 22
+
+PLACEHOLDER_COLOR = QColor(225, 225, 225)
+BORDER_COLOR = QColor(76, 76, 76)
+BUTTON_HOVER_COLOR = QColor(0x33, 0x33, 0x33)
+BUTTON_PRESSED_COLOR = QColor(0x11, 0x11, 0x11)
+GLOW_COLOR = QColor(Qt.cyan)
+REGION_COLOR = QColor(0, 200, 255, 60)
+REGION_BORDER_COLOR = QColor(0, 200, 255, 200)
+
+_placeholder = None
+
+
+def cover_placeholder() -> QPixmap:
+    """Pixmap shown while the real cover is being decoded
+    """
+    global _placeholder
+    if _placeholder is None:
+        _placeholder = QPixmap(COVER_WIDTH, COVER_HEIGHT)
+        _placeholder.fill(PLACEHOLDER_COLOR)
+    return _placeholder
+
+
+class ItemPart(IntEnum):
+    NONE = 0
+    COVER = 1
+    RECOGNIZE = 2
+    DELETE = 3
+
+
+def part_rects(rect: QRect) -> dict:
+    """Rects of every clickable part of a history item painted in rect
+    """
+    cover = QRect(rect.x() + 2, rect.y() + 2, COVER_WIDTH, COVER_HEIGHT)
+    name = QRect(rect.x(), cover.bottom() + 4, rect.width(), TEXT_HEIGHT)
+    date = QRect(rect.x(), name.bottom() + 2, rect.width(), TEXT_HEIGHT)
+    button_width = (rect.width() - 6) // 2
+    recognize = QRect(rect.x() + 2, date.bottom() + 2, button_width, BUTTON_HEIGHT)
+    delete = QRect(recognize.right() + 3, date.bottom() + 2, button_width, BUTTON_HEIGHT)
+    return {
+        ItemPart.COVER: cover,
+        ItemPart.RECOGNIZE: recognize,
+        ItemPart.DELETE: delete,
+        'name': name,
+        'date': date,
+    }
+
+
+class HistoryItemDelegate(QStyledItemDelegate):
+    """Paint a history item: cover, file name, time and two buttons
+
+    Nothing but the model row exists for an item, covers are decoded on
+    demand when the item is painted for the first time, so only visible items
+    cost memory. Items flagged new glow until they are pressed. Text regions
+    OCR read on a cover are outlined over it.
+    """
+    cover_ocr_needed = pyqtSignal(str)
+    deleting_needed = pyqtSignal(str)
+    cover_clicked = pyqtSignal(str)
+    item_pressed = pyqtSignal(str)
+
+    def __init__(self, rec_icon: QIcon, del_icon: QIcon, parent: QAbstractItemView):
+        super(HistoryItemDelegate, self).__init__(parent)
+        self._view = parent
+        self._rec_icon = rec_icon
+        self._del_icon = del_icon
+
+        self._font = QFont("Segoe UI")
+        self._hover = (QPersistentModelIndex(), ItemPart.NONE)
+        self._pressed = (QPersistentModelIndex(), ItemPart.NONE)
+        self._decoding = set()
+
+        self._glow_radius = 0
+        self._glow = QVariantAnimation(self)
+        self._glow.setDuration(2000)
+        self._glow.setLoopCount(5)
+        self._glow.setKeyValueAt(0, 1)
+        self._glow.setKeyValueAt(0.5, 30)
+        self._glow.setKeyValueAt(1, 1)
+        self._glow.valueChanged.connect(self._on_glow_changed)
+        self._glow.finished.connect(self._on_glow_finished)
+
+    def sizeHint(self, option, index) -> QSize:
+        return ITEM_SIZE
+
+    def start_glow(self):
+        if self._glow.state() != QVariantAnimation.Running:
+            self._glow.start()
+
+    def clear_hover(self):
+        if self._hover[1] != ItemPart.NONE:
+            self._hover = (QPersistentModelIndex(), ItemPart.NONE)
+            self._view.viewport().update()
+
+    def paint(self, painter: QPainter, option, index) -> None:
+        info = index.data(HistoryRole.INFO)
+        if info is None:
+            return
+        rect = QRect(option.rect.topLeft(), ITEM_SIZE)
+        rects = part_rects(rect)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+
+        # Border, and glow for new items
+        painter.setBrush(Qt.NoBrush)
+        if self._glow_radius > 0 and index.data(HistoryRole.IS_NEW):
+            color = QColor(GLOW_COLOR)
+            color.setAlpha(min(255, self._glow_radius * 8))
+            painter.setPen(QPen(color, 1 + self._glow_radius // 10))
+        else:
+            painter.setPen(QPen(BORDER_COLOR, 1))
+        painter.drawRoundedRect(rect.adjusted(0, 0, -1, -1), ITEM_RADIUS, ITEM_RADIUS)
+
+        painter.drawPixmap(rects[ItemPart.COVER], self._cover_pixmap(info.cover_dir))
+        self._paint_regions(painter, rects[ItemPart.COVER], index.data(HistoryRole.REGIONS))
+
+        painter.setFont(self._font)
+        painter.setPen(Qt.white)
+        metrics = painter.fontMetrics()
+        file_name = metrics.elidedText(os.path.basename(info.cover_dir), Qt.ElideMiddle, rect.width() - 8)
+        painter.drawText(rects['name'], Qt.AlignVCenter | Qt.AlignHCenter, file_name)
+        painter.drawText(rects['date'], Qt.AlignVCenter | Qt.AlignHCenter,
+                         time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(info.history_time)))
+
+        for part, icon in ((ItemPart.RECOGNIZE, self._rec_icon), (ItemPart.DELETE, self._del_icon)):
+            button_rect = rects[part]
+            if self._pressed == (index, part):
+                painter.fillRect(button_rect, BUTTON_PRESSED_COLOR)
+            elif self._hover == (index, part):
+                painter.fillRect(button_rect, BUTTON_HOVER_COLOR)
+            icon.paint(painter, button_rect, Qt.AlignCenter)
+
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index) -> bool:
+        info = index.data(HistoryRole.INFO)
+        if info is None:
+            return False
+        event_type = event.type()
+        if event_type not in (QEvent.MouseMove, QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+            return False
+
+        part = self._part_at(option.rect, event.pos())
+        persistent = QPersistentModelIndex(index)
+
+        if event_type == QEvent.MouseMove:
+            if self._hover != (persistent, part):
+                self._hover = (persistent, part)
+                self._view.viewport().update()
+            return False
+
+        if event.button() != Qt.LeftButton:
+            return False
+
+        if event_type == QEvent.MouseButtonPress:
+            self._pressed = (persistent, part)
+            self.item_pressed.emit(info.cover_dir)
+            self._view.viewport().update(option.rect)
+            return part in (ItemPart.RECOGNIZE, ItemPart.DELETE)
+
+        pressed = self._pressed
+        self._pressed = (QPersistentModelIndex(), ItemPart.NONE)
+        self._view.viewport().update(option.rect)
+        if pressed != (persistent, part):
+            return False
+        if part == ItemPart.RECOGNIZE:
+            self.cover_ocr_needed.emit(info.cover_dir)
+        elif part == ItemPart.DELETE:
+            self.deleting_needed.emit(info.cover_dir)
+        elif part == ItemPart.COVER:
+            self.cover_clicked.emit(info.cover_dir)
+        return part != ItemPart.NONE
+
+    @staticmethod
+    def _paint_regions(painter: QPainter, cover: QRect, regions):
+        """Boxes are relative to the picture, which fills the cover rect
+        """
+        if not regions:
+            return
+        painter.setPen(QPen(REGION_BORDER_COLOR, 1))
+        painter.setBrush(REGION_COLOR)
+        for x, y, w, h in regions:
+            painter.drawRect(QRectF(cover.x() + x * cover.width(), cover.y() + y * cover.height(),
+                                    w * cover.width(), h * cover.height()))
+        painter.setBrush(Qt.NoBrush)
+
+    @staticmethod
+    def _part_at(rect: QRect, pos) -> ItemPart:
+        rects = part_rects(QRect(rect.topLeft(), ITEM_SIZE))
+        for part in (ItemPart.COVER, ItemPart.RECOGNIZE, ItemPart.DELETE):
+            if rects[part].contains(pos):
+                return part
+        return ItemPart.NONE
+
+    def _cover_pixmap(self, cover_dir: str) -> QPixmap:
+        callback = None
+        if cover_dir not in self._decoding:
+            callback = partial(self._on_cover_decoded, cover_dir)
+        pixmap = get_image_decoder().request(cover_dir, QSize(COVER_WIDTH, COVER_HEIGHT), Qt.IgnoreAspectRatio,
+                                             callback)
+        if pixmap is None:
+            self._decoding.add(cover_dir)
+        elif not pixmap.isNull():
+            return pixmap
+        return cover_placeholder()
+
+    def _on_cover_decoded(self, cover_dir: str, _):
+        self._decoding.discard(cover_dir)
+        self._view.viewport().update()
+
+    def _on_glow_changed(self, value):
+        self._glow_radius = value
+        model = self._view.model()
+        if model is None or not model.has_new_items():
+            self._glow.stop()
+            self._on_glow_finished()
+        else:
+            self._view.viewport().update()
+
+    def _on_glow_finished(self):
+        self._glow_radius = 0
+        self._view.viewport().update()
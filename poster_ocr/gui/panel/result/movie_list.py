@@ -6,6 +6,7 @@ from PyQt5.QtWidgets import QTableView, QFrame, QAbstractItemView, QAction, QHea
     QMenu
 
 from poster_ocr.gui.util.dispatch import Signal
+from poster_ocr.gui.util.helpers import ReaderFetchMoreMixin
 from poster_ocr.vo.douban_movie import DoubanMovieInfo
 
 
@@ -18,20 +19,44 @@ class Column(IntEnum):
     DESCRIPTION = 5
 
 
-class MoviesTableModel(QAbstractTableModel):
+class MoviesTableModel(ReaderFetchMoreMixin, QAbstractTableModel):
     def __init__(self, parent=None):
         super().__init__(parent)
+        self._reader = None
         self._fetch_more_step = 30
         self._items = []
         self._is_fetching = False
 
-    def append_data_list(self, x: [DoubanMovieInfo]):
+    def set_reader(self, reader):
+        """Read rows lazily from reader, as the view scrolls down
+        """
         self.beginResetModel()
-        for info in x:
-            self._items.append(info)
+        self._reader = reader
+        self._is_fetching = False
+        self._items = []
         self.endResetModel()
 
+    def append_data_list(self, x: [DoubanMovieInfo]):
+        """Append rows at the end, views keep their selection and scroll position
+        """
+        if not x:
+            return
+        begin = len(self._items)
+        self.beginInsertRows(QModelIndex(), begin, begin + len(x) - 1)
+        self._items.extend(x)
+        self.endInsertRows()
+
+    def clear(self):
+        self.set_reader(None)
+
     def fetch_data(self) -> [DoubanMovieInfo]:
+        """All items, reading whatever a sync reader still holds
+        """
+        reader = self._reader
+        if reader is not None and not reader.is_async and self.can_fetch_more():
+            items = list(reader)
+            if items:
+                self.on_items_fetched(items)
         return self._items
 
     def removeRows(self, row, count, parent=QModelIndex()):
@@ -67,7 +92,6 @@ class MoviesTableModel(QAbstractTableModel):
                 widths = (0, 0.3, 0.15, 0.2, 0.1, 0.2)
                 width = self.parent().width()
                 w = int(width * widths[section])
-                print("" + section.__str__() + ": " + w.__str__())
                 return QSize(w, height)
         else:
             if role == Qt.DisplayRole:
@@ -0,0 +1,115 @@
+from PyQt5.QtCore import QObject, QTimer, QEvent, Qt
+from PyQt5.QtWidgets import QTableView
+
+from poster_ocr.cache.poster_cache import PosterCache
+from poster_ocr.gui.panel.cover.poster_downloader import PosterDownloader
+from poster_ocr.gui.panel.result.movie_list import Column
+from poster_ocr.net.rate_limiter import Priority, host_of
+
+DEFAULT_LOOK_AHEAD = 10
+DEFAULT_DELAY = 150
+
+
+class PosterPrefetcher(QObject):
+    """Warm the poster cache for rows visible in a table view
+
+    Rows inside the viewport plus ``look_ahead`` rows below it are fetched at
+    prefetch priority. Rows scrolling out of that window have their queued
+    fetches cancelled, while fetches already in flight are left to finish.
+    Updates are debounced by ``delay`` ms so fast scrolling costs nothing.
+    Hosts whose requests are saturated get no new prefetch until they drain.
+    """
+
+    def __init__(self, view: QTableView, downloader: PosterDownloader, cache: PosterCache,
+                 look_ahead=DEFAULT_LOOK_AHEAD, delay=DEFAULT_DELAY, parent=None):
+        super(PosterPrefetcher, self).__init__(parent)
+
+        self._view = view
+        self._downloader = downloader
+        self._cache = cache
+        self._look_ahead = look_ahead
+
+        self._model = None
+        self._requested = set()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+
+        self._bind_signals()
+
+    def _bind_signals(self):
+        self._timer.timeout.connect(self.update_window)
+        self._view.verticalScrollBar().valueChanged.connect(self.schedule)
+        self._view.viewport().installEventFilter(self)
+        self._downloader.downloaded.connect(self._on_done)
+        self._downloader.failed.connect(self._on_done)
+        self._downloader.limiter.saturated.connect(self._on_saturated)
+
+    def set_look_ahead(self, look_ahead: int):
+        self._look_ahead = look_ahead
+        self.schedule()
+
+    def watch_model(self, model):
+        """Follow rows of model, call it whenever the view gets a new model
+        """
+        if self._model is not None:
+            self._model.rowsInserted.disconnect(self.schedule)
+            self._model.rowsRemoved.disconnect(self.schedule)
+            self._model.modelReset.disconnect(self.schedule)
+        self._model = model
+        if model is not None:
+            model.rowsInserted.connect(self.schedule)
+            model.rowsRemoved.connect(self.schedule)
+            model.modelReset.connect(self.schedule)
+        self.schedule()
+
+    def schedule(self, *_):
+        self._timer.start()
+
+    def eventFilter(self, obj, event) -> bool:
+        if event.type() == QEvent.Resize:
+            self.schedule()
+        return False
+
+    def update_window(self):
+        wanted = set(self._visible_urls())
+
+        for url in self._requested - wanted:
+            self._downloader.cancel(url, Priority.PREFETCH, abort_running=False)
+        self._requested &= wanted
+
+        limiter = self._downloader.limiter
+        for url in wanted - self._requested:
+            if not limiter.is_saturated(host_of(url)) and not self._cache.contains(url):
+                self._downloader.fetch(url, Priority.PREFETCH)
+                self._requested.add(url)
+
+    def _visible_urls(self):
+        model = self._model
+        if model is None:
+            return
+        row_count = model.rowCount()
+        if row_count == 0:
+            return
+
+        first = self._view.rowAt(0)
+        last = self._view.rowAt(self._view.viewport().height() - 1)
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = row_count - 1
+        last = min(last + self._look_ahead, row_count - 1)
+
+        for row in range(first, last + 1):
+            movie = model.data(model.index(row, Column.MOVIE), Qt.UserRole)
+            url = getattr(movie, 'photo_url', None)
+            if url:
+                yield url
+
+    def _on_done(self, url: str, _):
+        self._requested.discard(url)
+
+    def _on_saturated(self, _, saturated: bool):
+        if not saturated:
+            self.schedule()
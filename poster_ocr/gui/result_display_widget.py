@@ -2,8 +2,10 @@ from PyQt5.QtCore import QPoint
 from PyQt5.QtWidgets import QVBoxLayout, QSizePolicy, QFrame, QAbstractScrollArea
 
 from gui.theme import read_qss_resource
+from poster_ocr.dao.reader import SearchResultReader
 from poster_ocr.gui.panel.cover.cover_display_render import Render
 from poster_ocr.gui.panel.result.movie_list import MoviesTableView, MoviesTableModel
+from poster_ocr.gui.panel.result.poster_prefetcher import PosterPrefetcher
 from poster_ocr.vo.douban_movie import DoubanMovieInfo
 
 StyleSheet = read_qss_resource('ResultDisplayPaneQSS.qss')
@@ -19,8 +21,10 @@ class ResDisplayWidget(QFrame):
 
         self.result_display_table.setSizeAdjustPolicy(QAbstractScrollArea.SizeAdjustPolicy.AdjustToContents)
         self.render = Render(parent=self)
+        self.prefetcher = PosterPrefetcher(self.result_display_table, self.render.downloader, self.render.cache,
+                                           parent=self)
 
-        self._model = None
+        self._model = MoviesTableModel(self.result_display_table)
 
         self._setup_ui()
         self._bind_signals()
@@ -37,16 +41,31 @@ class ResDisplayWidget(QFrame):
     def _bind_signals(self):
         self.result_display_table.pop_up_poster.connect(self._on_table_activated)
 
+        self.result_display_table.setModel(self._model)
+        self.prefetcher.watch_model(self._model)
+
     def _on_table_activated(self, info: str, mouse_relative_y: int):
         self.render.pop_new_bubble(QPoint(self.width() + 20, mouse_relative_y), info)
         # TODO 理论上这样会画到 parent 外，如果不行就换全局坐标试一试
 
     def show_results(self, lx: [DoubanMovieInfo]):
-        model = MoviesTableModel(self.result_display_table)
-        model.append_data_list(lx)
-        self._model = model
-        self.result_display_table.setModel(self._model)
+        """Replace displayed results with lx, rows are read lazily as the table scrolls
+        """
+        self._model.set_reader(SearchResultReader(lx))
         self.result_display_table.modify_size()
+        if self._model.canFetchMore():
+            self._model.fetchMore()
+
+    def clear_results(self):
+        """Drop displayed results, before streaming a new result set with append_results()
+        """
+        self._model.clear()
+        self.result_display_table.modify_size()
+
+    def append_results(self, lx: [DoubanMovieInfo]):
+        """Append a batch of results as they arrive, only the new rows are laid out
+        """
+        self._model.append_data_list(lx)
 
     def dump_results(self) -> [DoubanMovieInfo]:
         return self._model.fetch_data()
\ No newline at end of file
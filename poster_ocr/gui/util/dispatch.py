@@ -1,12 +1,21 @@
 # -*- coding: utf-8 -*-
 
+import asyncio
 import janus
 import logging
+import threading
 import weakref
+from collections import deque
+from enum import Enum
 
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_BATCH = 256
+# Queued callbacks run per wakeup of the worker before it yields to the loop
+WORKER_DRAIN_SIZE = 256
+_BLOCK_POLL_INTERVAL = 0.1
+
 
 def gen_id(target):
     if hasattr(target, '__func__'):
@@ -14,6 +23,278 @@ def gen_id(target):
     return id(target)
 
 
+class Delivery(Enum):
+    EACH = 0
+    """Call the receiver once per emit"""
+    BATCH = 1
+    """Call the receiver once with the list of args tuples emitted meanwhile"""
+    LATEST = 2
+    """Call the receiver once with the args of the last emit only"""
+
+
+class Overflow(Enum):
+    DROP_NEWEST = 0
+    DROP_OLDEST = 1
+    BLOCK = 2
+    """Wait in the emitting thread, the newest is dropped if it is the loop thread"""
+
+
+class DeliveryPolicy:
+    """How emits reach an aioqueued receiver
+
+    Emits of a receiver with a policy are kept in a queue of its own, and
+    one callback queued in its Dispatcher delivers up to max_batch of them,
+    so a burst of emits costs one wakeup of the loop rather than one each.
+
+    :param delivery:    See Delivery
+    :param max_batch:   Emits delivered per wakeup, the rest on the next ones
+    :param maxsize:     Emits waiting at most, 0 for no limit
+    :param overflow:    What to do with an emit beyond maxsize, see Overflow
+    :param timeout:     Seconds Overflow.BLOCK waits before dropping, None for ever
+    """
+
+    def __init__(self, delivery=Delivery.EACH, max_batch=DEFAULT_MAX_BATCH, maxsize=0,
+                 overflow=Overflow.DROP_OLDEST, timeout=None):
+        self.delivery = delivery
+        self.max_batch = max_batch
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.timeout = timeout
+
+    @classmethod
+    def batch(cls, max_batch=DEFAULT_MAX_BATCH, maxsize=0, overflow=Overflow.DROP_OLDEST):
+        return cls(Delivery.BATCH, max_batch, maxsize, overflow)
+
+    @classmethod
+    def latest(cls):
+        return cls(Delivery.LATEST)
+
+    @classmethod
+    def bounded(cls, maxsize, overflow=Overflow.DROP_OLDEST, timeout=None):
+        return cls(Delivery.EACH, DEFAULT_MAX_BATCH, maxsize, overflow, timeout)
+
+
+class _Channel:
+    """Emits waiting for one aioqueued receiver with a DeliveryPolicy
+
+    Emitting threads push, the loop delivers. The channel is queued in
+    its dispatcher at most once at a time, scheduled by the push that finds
+    it empty.
+    """
+
+    def __init__(self, policy: DeliveryPolicy, dispatcher: 'Dispatcher'):
+        self.policy = policy
+        self.dispatcher = dispatcher
+        self.dropped = 0
+        self._func = None
+        self._items = deque()
+        self._scheduled = False
+        self._cond = threading.Condition()
+
+    def push(self, func, args):
+        policy = self.policy
+        with self._cond:
+            self._func = func
+            if policy.delivery is Delivery.LATEST:
+                self.dropped += len(self._items)
+                self._items.clear()
+            elif policy.maxsize and len(self._items) >= policy.maxsize and not self._make_room():
+                self.dropped += 1
+                return
+            self._items.append(args)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        if not self.dispatcher.put(self.deliver, ()):
+            # Stopped meanwhile, the emits wait for the channel to be scheduled again
+            with self._cond:
+                self._scheduled = False
+
+    def _make_room(self) -> bool:
+        """Called with the lock held and the channel full, False to drop the newest emit
+        """
+        overflow = self.policy.overflow
+        if overflow is Overflow.DROP_OLDEST:
+            self._items.popleft()
+            self.dropped += 1
+            return True
+        if overflow is Overflow.BLOCK and threading.get_ident() != self.dispatcher.thread_id:
+            remaining = self.policy.timeout
+            while len(self._items) >= self.policy.maxsize and self.dispatcher.running:
+                if remaining is not None and remaining <= 0:
+                    return False
+                wait = _BLOCK_POLL_INTERVAL if remaining is None else min(remaining, _BLOCK_POLL_INTERVAL)
+                self._cond.wait(wait)
+                if remaining is not None:
+                    remaining -= wait
+            return len(self._items) < self.policy.maxsize
+        return False
+
+    def deliver(self):
+        policy = self.policy
+        with self._cond:
+            func = self._func
+            count = min(len(self._items), policy.max_batch)
+            items = [self._items.popleft() for _ in range(count)]
+            more = bool(self._items)
+            self._scheduled = more
+            self._cond.notify_all()
+        if more and not self.dispatcher.put(self.deliver, ()):
+            # Behind callbacks queued meanwhile, so a busy receiver can not starve others
+            with self._cond:
+                self._scheduled = False
+        if not items:
+            return
+        if policy.delivery is Delivery.BATCH:
+            func(items)
+            return
+        for args in items:
+            try:
+                func(*args)
+            except Exception:
+                logger.exception('receiver %s raise error' % func)
+
+
+class Dispatcher:
+    """Run callbacks queued from any thread in the thread of one event loop
+
+    Life cycle is start(), any number of drain(), then stop(), all awaited
+    in the loop. Callbacks put before drain() or stop() are run before they
+    return, unless stop() is asked not to flush. A stopped dispatcher can
+    not be started again.
+
+    Dispatchers of running loops are found with get_dispatcher(), so every
+    loop, e.g. one per worker thread or per test, can run one of its own.
+    """
+    _by_loop = weakref.WeakKeyDictionary()
+    _registry_lock = threading.Lock()
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None):
+        self.loop = loop
+        self.queue = None
+        self.worker_task = None
+        self.thread_id = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    @property
+    def running(self) -> bool:
+        return self.queue is not None
+
+    async def start(self) -> 'Dispatcher':
+        """Start the worker in the running loop
+        """
+        self.open(asyncio.get_running_loop())
+        # Let the worker reach the queue, thread_id is known from then on
+        await asyncio.sleep(0)
+        return self
+
+    def open(self, loop: asyncio.AbstractEventLoop = None):
+        """Start the worker in loop, which need not run yet, see start()
+
+        :raise RuntimeError: The dispatcher was already started, or loop has one running
+        """
+        loop = loop or self.loop or asyncio.get_event_loop()
+        with Dispatcher._registry_lock:
+            if self.queue is not None or self._stopped:
+                raise RuntimeError('dispatcher can only be started once')
+            current = Dispatcher._by_loop.get(loop)
+            if current is not None and current.running:
+                raise RuntimeError('loop already has a running dispatcher')
+            Dispatcher._by_loop[loop] = self
+            self.loop = loop
+            self.queue = janus.Queue()
+            self.worker_task = loop.create_task(self._worker())
+
+    def put(self, func, args) -> bool:
+        """Queue func(*args) from any thread, False if the dispatcher is not running
+        """
+        with self._lock:
+            if self.queue is None:
+                return False
+            self.queue.sync_q.put_nowait((func, args))
+        return True
+
+    async def drain(self):
+        """Wait until every callback queued so far, and those they queue, has run
+        """
+        if self.queue is not None:
+            await self.queue.async_q.join()
+
+    async def stop(self, flush=True, timeout: float = None):
+        """Stop the worker, after running queued callbacks if flush
+
+        Callbacks still queued once timeout seconds are spent flushing are
+        dropped. Emits reaching a stopped dispatcher call their receivers
+        in the emitting thread.
+        """
+        if self.queue is None:
+            return
+        if flush:
+            try:
+                await asyncio.wait_for(self.drain(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning('dropped %d callbacks not run within %s seconds',
+                               self.queue.async_q.qsize(), timeout)
+        queue, task = self.queue, self.worker_task
+        self.close()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        await queue.wait_closed()
+
+    def close(self):
+        """Stop the worker at once, dropping queued callbacks, see stop()
+        """
+        with self._lock:
+            queue, self.queue = self.queue, None
+            self._stopped = True
+        if queue is None:
+            return
+        self.worker_task.cancel()
+        queue.close()
+        with Dispatcher._registry_lock:
+            if Dispatcher._by_loop.get(self.loop) is self:
+                del Dispatcher._by_loop[self.loop]
+
+    async def _worker(self):
+        self.thread_id = threading.get_ident()
+        async_q = self.queue.async_q
+        while True:
+            # Run what is already queued in the same wakeup, up to a bound
+            items = [await async_q.get()]
+            while len(items) < WORKER_DRAIN_SIZE:
+                try:
+                    items.append(async_q.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            for func, args in items:
+                try:
+                    func(*args)
+                except:  # noqa
+                    logger.exception(f'run {func.__name__} with {args} failed')
+                async_q.task_done()
+            if not async_q.empty():
+                # get() does not yield while the queue is not empty
+                await asyncio.sleep(0)
+
+
+def get_dispatcher(loop: asyncio.AbstractEventLoop = None) -> Dispatcher:
+    """Running dispatcher of loop, of the running loop by default, else the
+    one of Signal.setup_aio_support(), None if there is none
+    """
+    if loop is None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+    dispatcher = Dispatcher._by_loop.get(loop) if loop is not None else None
+    if dispatcher is None or not dispatcher.running:
+        dispatcher = Signal.dispatcher
+    return dispatcher if dispatcher is not None and dispatcher.running else None
+
+
 class Signal:
     """provider signal/slot design pattern
 
@@ -21,14 +302,21 @@ class Signal:
 
     参考 django dispatcher 模块实现
     """
-    aioqueue = None
+    dispatcher = None
+    """Dispatcher of setup_aio_support(), used when connecting outside of a running loop"""
     has_aio_support = False
-    worker_task = None
 
-    def __init__(self, name='', *sig):
+    def __init__(self, name='', *sig, policy: DeliveryPolicy = None):
+        """
+        :param policy:  Default DeliveryPolicy of aioqueued receivers
+        """
+        self.name = name
         self.sig = sig
-        self.aioqueued_receiver_ids = set()
-        self.receivers = set()
+        self.policy = policy
+        # receiver id -> (receiver or weak reference to it, is weak, Dispatcher if aioqueued, _Channel or None)
+        self._receivers = {}
+        # Rebuilt on every change, so emit() iterates it without copying
+        self._snapshot = ()
 
     @classmethod
     def setup_aio_support(cls, loop=None):
@@ -36,92 +324,115 @@ class Signal:
         我们这里通过 asyncio Queue 来实现。
 
         这个和 qt signal 的设计类似。
+
+        The Dispatcher started in loop is the default one of aioqueued
+        receivers, the loop need not run yet.
         """
-        if loop is None:
-            import asyncio
-            loop = asyncio.get_event_loop()
-        cls.aioqueue = janus.Queue()
-        cls.worker_task = loop.create_task(Signal.worker())
+        dispatcher = Dispatcher(loop)
+        dispatcher.open()
+        cls.dispatcher = dispatcher
         cls.has_aio_support = True
+        return dispatcher
 
     @classmethod
-    def teardown_aio_support(cls):
-        """
-        HELP: maybe add a wait_aio_support_teardown method?
+    def teardown_aio_support(cls, flush=True):
+        """Stop the default dispatcher
+
+        If its loop is running, queued callbacks are run first when flush,
+        and the task stopping it is returned to be awaited. Otherwise they
+        are dropped and None is returned.
         """
-        cls.aioqueue.close()
-        cls.worker_task.cancel()
+        dispatcher, cls.dispatcher = cls.dispatcher, None
         cls.has_aio_support = False
-        cls.aioqueue = None
+        if dispatcher is None:
+            return None
+        if dispatcher.loop.is_running():
+            return dispatcher.loop.create_task(dispatcher.stop(flush))
+        dispatcher.close()
+        return None
 
-    @classmethod
-    async def worker(cls):
-        while True:
-            func, args = await cls.aioqueue.async_q.get()
-            try:
-                func(*args)
-            except:  # noqa
-                logger.exception(f'run {func.__name__} with {args} failed')
-            cls.aioqueue.async_q.task_done()
+    @property
+    def receivers(self) -> tuple:
+        """Receivers or weak references to them, in a tuple replaced on every change
+        """
+        return tuple(entry[0] for entry in self._snapshot)
 
     def emit(self, *args):
-        # allow remove receiver during emitting
-        for receiver in self.receivers.copy():
+        # Receivers connected or disconnected meanwhile are seen by the next emit
+        for target, weak, dispatcher, channel in self._snapshot:
+            func = target() if weak else target
+            if func is None:
+                continue
             try:
-                if self._is_alive(receiver):
-                    if isinstance(receiver, weakref.ReferenceType):
-                        func = receiver()
-                    else:
-                        func = receiver
-                    if Signal.has_aio_support:
-                        uid = gen_id(func)
-                        aioqueue = uid in self.aioqueued_receiver_ids
-                        if aioqueue:
-                            Signal.aioqueue.sync_q.put_nowait((func, args))
-                        else:
-                            func(*args)
-                    else:
+                if dispatcher is None or not dispatcher.running:
+                    func(*args)
+                elif channel is None:
+                    if not dispatcher.put(func, args):
                         func(*args)
                 else:
-                    logger.debug('receiver:{} is dead'.format(receiver))
+                    channel.push(func, args)
             except Exception:
-                logger.exception('receiver %s raise error' % receiver)
+                logger.exception('receiver %s raise error' % func)
 
-    def _ref(self, receiver):
+    def _ref(self, receiver, uid):
+        """Weak reference to receiver, dropping it from this signal once dead
+        """
         ref = weakref.ref
         if hasattr(receiver, '__self__') and hasattr(receiver, '__func__'):
             ref = weakref.WeakMethod
-            receiver_object = receiver.__self__
-            weakref.finalize(receiver_object, self._clear_dead_receivers)
-        return ref(receiver)
+        signal = weakref.ref(self)
 
-    def connect(self, receiver, weak=True, aioqueue=False):
-        if weak:
-            self.receivers.add(self._ref(receiver))
-        else:
-            self.receivers.add(receiver)
+        def on_dead(dead_ref):
+            alive = signal()
+            if alive is not None:
+                alive._remove_dead(uid, dead_ref)
+        return ref(receiver, on_dead)
+
+    def connect(self, receiver, weak=True, aioqueue=False, policy: DeliveryPolicy = None,
+                dispatcher: Dispatcher = None):
+        """
+        :param aioqueue:    Call receiver in the loop thread rather than the emitting one
+        :param policy:      DeliveryPolicy of an aioqueued receiver, the one
+                            of the signal by default, one call per emit without
+        :param dispatcher:  Dispatcher of an aioqueued receiver, see get_dispatcher() for the default
+        """
+        if policy is not None and not aioqueue:
+            raise ValueError('a delivery policy only applies to aioqueued receivers')
         if aioqueue:
-            if Signal.aioqueue is None:
+            dispatcher = dispatcher or get_dispatcher()
+            if dispatcher is None or not dispatcher.running:
                 raise RuntimeError('Signal is not setuped with asyncio.')
-            self.aioqueued_receiver_ids.add(gen_id(receiver))
+            if policy is None:
+                policy = self.policy
+        else:
+            dispatcher = None
+        uid = gen_id(receiver)
+        target = self._ref(receiver, uid) if weak else receiver
+        channel = _Channel(policy, dispatcher) if policy is not None else None
+        self._receivers[uid] = (target, weak, dispatcher, channel)
+        self._update_snapshot()
+
+    def dropped_count(self, receiver) -> int:
+        """Emits dropped by the delivery policy of receiver so far
+        """
+        entry = self._receivers.get(gen_id(receiver))
+        return entry[3].dropped if entry is not None and entry[3] is not None else 0
 
     def disconnect(self, receiver):
-        if receiver in self.receivers:
-            self.receivers.remove(receiver)
-        elif self._ref(receiver) in self.receivers:
-            self.receivers.remove(self._ref(receiver))
-        else:
+        if self._receivers.pop(gen_id(receiver), None) is None:
             return False
-        uid = gen_id(receiver)
-        if uid in self.aioqueued_receiver_ids:
-            self.aioqueued_receiver_ids.remove(uid)
-        return False
+        self._update_snapshot()
+        return True
 
-    def _is_alive(self, r):
-        return not(isinstance(r, weakref.ReferenceType) and r() is None)
+    def _remove_dead(self, uid, dead_ref):
+        entry = self._receivers.get(uid)
+        # The id may have been reused by a receiver connected since
+        if entry is not None and entry[0] is dead_ref:
+            del self._receivers[uid]
+            self._update_snapshot()
 
-    def _clear_dead_receivers(self):
-        self.receivers = set([r for r in self.receivers if self._is_alive(r)])
+    def _update_snapshot(self):
+        self._snapshot = tuple(self._receivers.values())
 
 
 def receiver(signal):
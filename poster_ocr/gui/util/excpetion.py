@@ -12,3 +12,19 @@ class ListWidgetItemNotMatchedException(Exception):
 
 class NetworkRequestingErrorException(Exception):
     pass
+
+
+class RequestCancelledException(Exception):
+    pass
+
+
+class OcrFailedException(Exception):
+    pass
+
+
+class OcrTimeoutException(OcrFailedException):
+    pass
+
+
+class OcrQueueFullException(Exception):
+    pass
@@ -30,10 +30,12 @@ class ReaderFetchMoreMixin:
 
     def can_fetch_more(self, _=None):
         reader = self._reader
+        if reader is None:
+            return False
 
         count, offset = reader.count, reader.offset
         if count is not None:
-            return count > offset + 1
+            return count > offset
 
         # The reader sets the count when it has no more items,
         # so it is safe to return True here
@@ -77,7 +79,10 @@ class ReaderFetchMoreMixin:
         self._is_fetching = False
         if items is None:
             return
-        self.on_items_fetched(items)
+        if items:
+            self.on_items_fetched(items)
+        if not self.can_fetch_more():
+            self.no_more_item.emit()
 
     def _async_fetch_cb(self, future):
         try:
@@ -0,0 +1,192 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from PyQt5.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+
+from poster_ocr.cache.thumbnail_store import ThumbnailStore
+from poster_ocr.gui.util.pixmap_cache import pixmap_cache, PixmapCache
+
+logger = logging.getLogger(__name__)
+
+# Failed decodes remembered at most, and for how long
+MAX_FAILED = 256
+FAILED_TTL = 30.0
+
+
+def decode_scaled(source: str, size: QSize = None, aspect_mode=Qt.KeepAspectRatio) -> QImage:
+    """Decode the image file at source straight to size
+
+    The decoder is asked for the scaled size, so formats like JPEG never
+    materialize the full resolution image. Images are only ever shrunk.
+    """
+    reader = QImageReader(source)
+    reader.setAutoTransform(True)
+    if size is not None:
+        original = reader.size()
+        if original.isValid():
+            target = original.scaled(size, aspect_mode)
+            if target.width() < original.width() or target.height() < original.height():
+                reader.setScaledSize(target)
+    image = reader.read()
+    if image.isNull():
+        logger.warning('decode %s failed: %s', source, reader.errorString())
+    return image
+
+
+def _file_signature(source: str):
+    """(mtime, size) of source, None if it is missing
+    """
+    try:
+        st = os.stat(source)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class _DecodeSignals(QObject):
+    decoded = pyqtSignal(object, QImage)
+
+
+class _DecodeTask(QRunnable):
+    def __init__(self, key, signals: _DecodeSignals, thumbnails: ThumbnailStore = None):
+        super(_DecodeTask, self).__init__()
+        self._key = key
+        self._signals = signals
+        self._thumbnails = thumbnails
+
+    def run(self):
+        source, width, height, aspect_mode = self._key
+        size = QSize(width, height) if width and height else None
+        try:
+            if size is not None and self._thumbnails is not None:
+                image = self._thumbnails.load(source, size, aspect_mode)
+                if image.isNull():
+                    image = decode_scaled(source, size, aspect_mode)
+                    try:
+                        self._thumbnails.save(source, size, image, aspect_mode)
+                    except OSError as e:
+                        # The decoded image is still good, only the next decode is not saved
+                        logger.warning('save thumbnail of %s failed: %s', source, e)
+            else:
+                image = decode_scaled(source, size, aspect_mode)
+        except Exception:  # noqa
+            logger.exception('decode %s failed', source)
+            image = QImage()
+        self._signals.decoded.emit(self._key, image)
+
+
+class _TrimTask(QRunnable):
+    def __init__(self, thumbnails: ThumbnailStore):
+        super(_TrimTask, self).__init__()
+        self._thumbnails = thumbnails
+
+    def run(self):
+        try:
+            self._thumbnails.trim()
+        except OSError:
+            logger.exception('trim thumbnails failed')
+
+
+class ImageDecoder(QObject):
+    """Decode and downscale image files on a thread pool
+
+    Decoded images come back to the GUI thread, are converted to QPixmap
+    and stored in the PixmapCache, then handed to every callback waiting for
+    the same (source, size, aspect mode). A callback gets a null pixmap if
+    decoding failed. Later requests get that null pixmap right away while
+    the file keeps the same mtime and size, for FAILED_TTL seconds at most,
+    or until invalidate() is called for it.
+
+    With a ThumbnailStore, scaled images are read from and written to disk,
+    so the original file is only decoded once per version and size.
+    """
+
+    def __init__(self, cache: PixmapCache = pixmap_cache, thumbnails: ThumbnailStore = None, max_threads=None,
+                 parent=None):
+        super(ImageDecoder, self).__init__(parent)
+        self._cache = cache
+        self._thumbnails = thumbnails
+
+        self._pool = QThreadPool(self)
+        if max_threads is not None:
+            self._pool.setMaxThreadCount(max_threads)
+
+        self._signals = _DecodeSignals(self)
+        self._signals.decoded.connect(self._on_decoded)
+
+        self._pending = {}
+        # key -> (mtime and size of the source, time of the failure), oldest first
+        self._failed = OrderedDict()
+
+        if thumbnails is not None:
+            self._pool.start(_TrimTask(thumbnails))
+
+    def request(self, source: str, size: QSize = None, aspect_mode=Qt.KeepAspectRatio, callback=None):
+        """Return the cached pixmap right away, or None and decode in background
+
+        :param callback: Called with the pixmap when decoding is done
+        """
+        pixmap = self._cache.find(source, size, aspect_mode)
+        if pixmap is not None:
+            return pixmap
+
+        key = self._cache.make_key(source, size, aspect_mode)
+        if self._has_failed(key):
+            return QPixmap()
+        callbacks = self._pending.get(key)
+        if callbacks is None:
+            self._pending[key] = callbacks = []
+            self._pool.start(_DecodeTask(key, self._signals, self._thumbnails))
+        if callback is not None:
+            callbacks.append(callback)
+        return None
+
+    def _on_decoded(self, key, image: QImage):
+        source, width, height, aspect_mode = key
+        size = QSize(width, height) if width and height else None
+        pixmap = QPixmap.fromImage(image)
+        if not pixmap.isNull():
+            pixmap = self._cache.insert(source, pixmap, size, aspect_mode)
+        else:
+            self._failed[key] = (_file_signature(source), time.monotonic())
+            self._failed.move_to_end(key)
+            if len(self._failed) > MAX_FAILED:
+                self._failed.popitem(last=False)
+
+        for callback in self._pending.pop(key, []):
+            try:
+                callback(pixmap)
+            except RuntimeError:
+                # Receiver widget was destroyed while decoding
+                logger.debug('drop decoded %s, receiver is gone', source)
+
+    def invalidate(self, source: str):
+        """Forget failed decodes of source, e.g. once it has been written
+        """
+        for key in [key for key in self._failed if key[0] == source]:
+            del self._failed[key]
+
+    def _has_failed(self, key) -> bool:
+        failure = self._failed.get(key)
+        if failure is None:
+            return False
+        signature, failed_at = failure
+        if time.monotonic() - failed_at < FAILED_TTL and _file_signature(key[0]) == signature:
+            return True
+        del self._failed[key]
+        return False
+
+
+_image_decoder = None
+
+
+def get_image_decoder() -> ImageDecoder:
+    """Decoder shared by every widget, created on first use in the GUI thread
+    """
+    global _image_decoder
+    if _image_decoder is None:
+        _image_decoder = ImageDecoder(thumbnails=ThumbnailStore())
+    return _image_decoder
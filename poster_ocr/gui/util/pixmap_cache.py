@@ -0,0 +1,107 @@
+import logging
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtGui import QPixmap
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+
+
+def pixmap_bytes(pixmap: QPixmap) -> int:
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class PixmapCache:
+    """Process-wide LRU cache of decoded pixmaps
+
+    Entries are keyed by (source, target size, aspect mode), where source is
+    a file path or an url, and target size is None for the original image.
+    The cache is bounded by the bytes of decoded pixels it holds.
+
+    QPixmap lives on the GUI thread, so should this cache.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self._max_bytes = max_bytes
+        self._total_bytes = 0
+        self._items = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(source: str, size: QSize = None, aspect_mode=Qt.KeepAspectRatio):
+        if size is None:
+            return source, 0, 0, aspect_mode
+        return source, size.width(), size.height(), aspect_mode
+
+    def find(self, source: str, size: QSize = None, aspect_mode=Qt.KeepAspectRatio):
+        """Cached pixmap for source at size, or None
+        """
+        key = self.make_key(source, size, aspect_mode)
+        pixmap = self._items.get(key)
+        if pixmap is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return pixmap
+
+    def insert(self, source: str, pixmap: QPixmap, size: QSize = None, aspect_mode=Qt.KeepAspectRatio) -> QPixmap:
+        """Scale pixmap to size if given, cache and return it
+        """
+        if pixmap is None or pixmap.isNull():
+            return pixmap
+        if size is not None and pixmap.size().scaled(size, aspect_mode) != pixmap.size():
+            pixmap = pixmap.scaled(size, aspect_mode, Qt.SmoothTransformation)
+
+        key = self.make_key(source, size, aspect_mode)
+        old = self._items.pop(key, None)
+        if old is not None:
+            self._total_bytes -= pixmap_bytes(old)
+        self._items[key] = pixmap
+        self._total_bytes += pixmap_bytes(pixmap)
+        self._evict()
+        return pixmap
+
+    def load(self, source: str, size: QSize = None, aspect_mode=Qt.KeepAspectRatio) -> QPixmap:
+        """Pixmap of the image file at source, decoded and scaled only on miss
+        """
+        pixmap = self.find(source, size, aspect_mode)
+        if pixmap is None:
+            pixmap = self.insert(source, QPixmap(source), size, aspect_mode)
+        return pixmap
+
+    def discard(self, source: str):
+        """Drop every size cached for source
+        """
+        for key in [k for k in self._items if k[0] == source]:
+            self._total_bytes -= pixmap_bytes(self._items.pop(key))
+
+    def clear(self):
+        self._items.clear()
+        self._total_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'count': len(self._items),
+            'bytes': self._total_bytes,
+            'max_bytes': self._max_bytes,
+        }
+
+    def _evict(self):
+        # The newest entry always stays, even if it is bigger than the budget
+        while self._total_bytes > self._max_bytes and len(self._items) > 1:
+            _, pixmap = self._items.popitem(last=False)
+            self._total_bytes -= pixmap_bytes(pixmap)
+            self.evictions += 1
+
+
+#: shared by every widget showing posters or covers
+pixmap_cache = PixmapCache()
@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from enum import IntEnum
+from urllib.parse import urlsplit
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 5.0
+DEFAULT_BURST = 10
+
+DEFAULT_HIGH_WATER = 64
+
+
+class Priority(IntEnum):
+    """Lower value is served first"""
+    INTERACTIVE = 0
+    PREFETCH = 1
+    BACKGROUND = 2
+
+
+#: Tokens a priority leaves in the bucket for the ones above it
+DEFAULT_RESERVE = {
+    Priority.INTERACTIVE: 0,
+    Priority.PREFETCH: 2,
+    Priority.BACKGROUND: 4,
+}
+
+
+def host_of(url: str) -> str:
+    """Host of url, or url itself if it is already a host name
+    """
+    return urlsplit(url).hostname or url
+
+
+class TokenBucket:
+    """``rate`` tokens per second, at most ``burst`` of them saved up
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def try_take(self, reserve=0) -> bool:
+        """Take a token if more than reserve tokens are left
+        """
+        self._refill()
+        if self._tokens - reserve >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def delay(self, reserve=0) -> float:
+        """Seconds until try_take(reserve) can succeed
+        """
+        self._refill()
+        missing = 1 + reserve - self._tokens
+        return max(missing, 0) / self.rate
+
+
+class Ticket:
+    """A request waiting for its token, cancel() gives up the place in queue
+    """
+
+    def __init__(self, limiter, host: str, priority: Priority, callback):
+        self._limiter = limiter
+        self.host = host
+        self.priority = priority
+        self.callback = callback
+        self.granted = False
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.granted and not self.cancelled:
+            self.cancelled = True
+            self._limiter._on_cancelled(self)
+
+
+class _HostQueue:
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.waiting = []
+        self.size = 0
+        self.saturated = False
+        # asyncio.TimerHandle of the next refill waited for
+        self.wakeup = None
+
+
+class RateLimiter(QObject):
+    """Token bucket per host shared by every outbound HTTP request
+
+    A request asks for a token of its host with request() or acquire() and
+    only goes out once granted. Waiting requests are served by priority,
+    FIFO within the same priority, and a priority only takes a token while
+    more than its reserve is left in the bucket. Background crawling thus
+    never drains the tokens an interactive request needs, whatever the
+    length of its queue.
+
+    saturated is emitted when the queue of a host reaches ``high_water``
+    requests and again when it drains to half of it, producers of optional
+    requests should hold off meanwhile.
+
+    The limiter lives on the thread of the asyncio event loop, qasync's one
+    in the GUI. Requests waiting for a refill are granted from a call_later()
+    of that loop, so the limiter works under Qt and plain asyncio alike.
+    """
+    saturated = pyqtSignal(str, bool)
+    """Emitted with (host, whether its queue is saturated)"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, reserve=None, high_water=DEFAULT_HIGH_WATER,
+                 parent=None):
+        super(RateLimiter, self).__init__(parent)
+
+        self._rate = rate
+        self._burst = burst
+        self._reserve = dict(DEFAULT_RESERVE)
+        if reserve:
+            self._reserve.update(reserve)
+        self._high_water = high_water
+        self._low_water = high_water // 2
+
+        self._limits = {}
+        self._hosts = {}
+        self._seq = itertools.count()
+
+    def set_host_limit(self, host: str, rate: float, burst: int):
+        """Override rate and burst for host
+        """
+        self._limits[host] = (rate, burst)
+        queue = self._hosts.get(host)
+        if queue is not None:
+            queue.bucket.rate, queue.bucket.burst = rate, burst
+
+    def request(self, url: str, priority=Priority.INTERACTIVE, callback=None) -> Ticket:
+        """Call callback() once a token for the host of url is granted
+
+        The callback runs synchronously if a token is available right away.
+        """
+        host = host_of(url)
+        ticket = Ticket(self, host, priority, callback)
+        queue = self._queue(host)
+        heapq.heappush(queue.waiting, (priority, next(self._seq), ticket))
+        queue.size += 1
+        self._pump(host)
+        self._check_saturation(host, queue)
+        return ticket
+
+    async def acquire(self, url: str, priority=Priority.INTERACTIVE):
+        """Wait for a token for the host of url, cancelling the waiter gives up the place in queue
+        """
+        future = asyncio.get_event_loop().create_future()
+
+        def grant():
+            if not future.done():
+                future.set_result(None)
+
+        ticket = self.request(url, priority, grant)
+        try:
+            await future
+        except asyncio.CancelledError:
+            ticket.cancel()
+            raise
+
+    def queued_count(self, host: str = None) -> int:
+        """Requests waiting for host, or for any host
+        """
+        if host is not None:
+            queue = self._hosts.get(host)
+            return queue.size if queue is not None else 0
+        return sum(queue.size for queue in self._hosts.values())
+
+    def is_saturated(self, host: str = None) -> bool:
+        if host is not None:
+            queue = self._hosts.get(host)
+            return queue is not None and queue.saturated
+        return any(queue.saturated for queue in self._hosts.values())
+
+    def _queue(self, host: str) -> _HostQueue:
+        queue = self._hosts.get(host)
+        if queue is None:
+            rate, burst = self._limits.get(host, (self._rate, self._burst))
+            queue = _HostQueue(TokenBucket(rate, burst))
+            self._hosts[host] = queue
+        return queue
+
+    def _pump(self, host: str):
+        queue = self._hosts.get(host)
+        if queue is None:
+            return
+        while queue.waiting:
+            priority, _, ticket = queue.waiting[0]
+            if ticket.cancelled:
+                heapq.heappop(queue.waiting)
+                continue
+            reserve = min(self._reserve.get(priority, 0), queue.bucket.burst - 1)
+            if not queue.bucket.try_take(reserve):
+                self._wake_up_later(host, queue, queue.bucket.delay(reserve))
+                break
+            heapq.heappop(queue.waiting)
+            queue.size -= 1
+            ticket.granted = True
+            try:
+                ticket.callback()
+            except Exception:  # noqa
+                logger.exception('run granted request of %s failed', host)
+        self._check_saturation(host, queue)
+
+    def _wake_up_later(self, host: str, queue: _HostQueue, delay: float):
+        """Pump host again once its bucket is refilled, replacing the wakeup pending if any
+        """
+        if queue.wakeup is not None:
+            queue.wakeup.cancel()
+        queue.wakeup = asyncio.get_event_loop().call_later(max(delay, 0.001), self._on_wakeup, host)
+
+    def _on_wakeup(self, host: str):
+        queue = self._hosts.get(host)
+        if queue is not None:
+            queue.wakeup = None
+            self._pump(host)
+
+    def _on_cancelled(self, ticket: Ticket):
+        queue = self._hosts.get(ticket.host)
+        if queue is not None:
+            queue.size -= 1
+            self._check_saturation(ticket.host, queue)
+
+    def _check_saturation(self, host: str, queue: _HostQueue):
+        if not queue.saturated and queue.size >= self._high_water:
+            queue.saturated = True
+            logger.info('Requests to %s are saturated, %d waiting', host, queue.size)
+            self.saturated.emit(host, True)
+        elif queue.saturated and queue.size <= self._low_water:
+            queue.saturated = False
+            self.saturated.emit(host, False)
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """RateLimiter shared by the whole application
+    """
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
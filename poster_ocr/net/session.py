@@ -0,0 +1,52 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from poster_ocr.gui.util.excpetion import RequestCancelledException
+
+DEFAULT_TIMEOUT = (5, 20)
+CHUNK_SIZE = 64 * 1024
+
+POOL_CONNECTIONS = 8
+POOL_MAXSIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+
+#: executor running every blocking HTTP call, keep them off the GUI thread
+http_executor = ThreadPoolExecutor(max_workers=POOL_MAXSIZE, thread_name_prefix='poster-ocr-http')
+
+
+def get_session() -> requests.Session:
+    """Process-wide session, connections are pooled and kept alive per host
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def fetch_bytes(url: str, cancel_event: threading.Event = None, timeout=DEFAULT_TIMEOUT) -> bytes:
+    """Download url with the shared session, blocking
+
+    The body is streamed in chunks so setting cancel_event stops the download
+    between two chunks with RequestCancelledException.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        raise RequestCancelledException
+    with get_session().get(url, stream=True, timeout=timeout) as resp:
+        resp.raise_for_status()
+        chunks = []
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            if cancel_event is not None and cancel_event.is_set():
+                raise RequestCancelledException
+            chunks.append(chunk)
+    return b''.join(chunks)
@@ -0,0 +1,223 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from poster_ocr.cache.paths import cache_dir
+from poster_ocr.dao.history_pane_dao import HistoryInfoDao
+from poster_ocr.gui.util import aio
+from poster_ocr.gui.util.dispatch import DeliveryPolicy, Signal
+from poster_ocr.gui.util.excpetion import OcrQueueFullException
+from poster_ocr.ocr.pool import OcrWorkerPool
+from poster_ocr.ocr.tags import TagExtractor
+from poster_ocr.vo.history_item import HistoryItemInfo
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = frozenset(['.jpg', '.jpeg', '.png', '.bmp', '.webp', '.gif', '.tif', '.tiff'])
+
+DEFAULT_FLUSH_SIZE = 50
+QUEUE_FULL_RETRY_DELAY = 0.2
+
+
+def iter_images(root: str, extensions=IMAGE_EXTENSIONS):
+    """Yield image files under root lazily, in a stable order
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            logger.warning('scan %s failed', directory, exc_info=True)
+            continue
+        sub_dirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                sub_dirs.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in extensions:
+                yield entry.path
+        stack.extend(reversed(sub_dirs))
+
+
+def default_journal_path(root: str) -> str:
+    """Journal of a folder, under the cache directory
+    """
+    digest = hashlib.sha1(os.path.abspath(root).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir('batch'), digest + '.jsonl')
+
+
+class BatchJournal:
+    """Append-only JSON lines record of a batch, one line per picture
+
+    A line is either ``{"path", "tags"}`` or ``{"path", "error"}``, the last
+    line of a path wins. Recognized pictures are skipped when the batch is
+    run again, failed ones are retried.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def read(self) -> dict:
+        """{path: tags} of every picture recognized so far
+        """
+        done = {}
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Last line of an interrupted write
+                        continue
+                    if 'tags' in record:
+                        done[record['path']] = record['tags']
+                    else:
+                        done.pop(record['path'], None)
+        except FileNotFoundError:
+            pass
+        return done
+
+    def append(self, records: [dict]):
+        if not records:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        with open(self._path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self):
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class BatchOcr:
+    """Recognize every picture under a folder through an OcrWorkerPool
+
+    Pictures are streamed from the folder while it is being scanned, with
+    at most ``max_in_flight`` of them in the pool. Results are written every
+    ``flush_size`` pictures, to the journal and as history records in one
+    transaction, so an interrupted batch resumes where its last write ended.
+
+    The journal keeps the lines read on every picture, its history record is
+    titled by the best tag the extractor finds in them.
+    """
+
+    def __init__(self, pool: OcrWorkerPool, dao: HistoryInfoDao = None, user_id='default',
+                 flush_size=DEFAULT_FLUSH_SIZE, max_in_flight=None, extractor: TagExtractor = None):
+        self._pool = pool
+        self._dao = dao
+        self._user_id = user_id
+        self._extractor = extractor or TagExtractor()
+        self._flush_size = flush_size
+        # Leave room in the pool for covers the user asks for meanwhile
+        self._max_in_flight = max_in_flight or max(1, pool.max_pending // 2)
+
+        self._task = None
+
+        self.progress = Signal('progress', int, int, int, policy=DeliveryPolicy.latest())
+        """Emitted with (recognized, failed, found so far), queued receivers only get the latest"""
+
+        self.records_written = Signal('records_written', list)
+        """Emitted with the HistoryItemInfo written by a flush"""
+
+        self.finished = Signal('finished', int, int)
+        """Emitted with (recognized, failed) once the batch ends, completed or not"""
+
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, root: str, journal: BatchJournal = None):
+        """Run the batch of root in background, nothing happens if one is running
+        """
+        if not self.is_running():
+            self._task = aio.create_task(self.run(root, journal))
+        return self._task
+
+    def cancel(self):
+        if self.is_running():
+            self._task.cancel()
+
+    def _title_of(self, lines: [str]) -> str:
+        tags = self._extractor.extract(lines)
+        if tags:
+            return tags[0]
+        return lines[0] if lines else ''
+
+    async def run(self, root: str, journal: BatchJournal = None) -> (int, int):
+        """Recognize pictures under root not recorded in journal yet
+
+        :return: Number of recognized and failed pictures, skipped ones excluded
+        """
+        root = os.path.abspath(root)
+        journal = journal or BatchJournal(default_journal_path(root))
+        done = journal.read()
+        slots = asyncio.Semaphore(self._max_in_flight)
+        pending = {}
+        records = []
+        counts = {'recognized': 0, 'failed': 0, 'found': 0}
+
+        def flush():
+            if not records:
+                return
+            journal.append(records)
+            now = time.time()
+            infos = [HistoryItemInfo(r['path'], self._title_of(r['tags']), now) for r in records if 'tags' in r]
+            if infos and self._dao is not None:
+                self._dao.insert_history_infos(self._user_id, infos)
+            records.clear()
+            if infos:
+                self.records_written.emit(infos)
+
+        async def recognize(path):
+            try:
+                while True:
+                    try:
+                        tags = await self._pool.recognize(path, notify=False)
+                        break
+                    except OcrQueueFullException:
+                        await asyncio.sleep(QUEUE_FULL_RETRY_DELAY)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # noqa
+                counts['failed'] += 1
+                records.append({'path': path, 'error': str(e) or e.__class__.__name__})
+            else:
+                counts['recognized'] += 1
+                records.append({'path': path, 'tags': tags})
+            finally:
+                slots.release()
+            if len(records) >= self._flush_size:
+                flush()
+            self.progress.emit(counts['recognized'], counts['failed'], counts['found'])
+
+        try:
+            for path in iter_images(root):
+                if path in done:
+                    continue
+                counts['found'] += 1
+                await slots.acquire()
+                task = aio.create_task(recognize(path))
+                pending[task] = path
+                task.add_done_callback(lambda t: pending.pop(t, None))
+            if pending:
+                await asyncio.gather(*pending)
+        except asyncio.CancelledError:
+            for task, path in list(pending.items()):
+                task.cancel()
+                self._pool.cancel(path)
+            raise
+        finally:
+            flush()
+            self.finished.emit(counts['recognized'], counts['failed'])
+        return counts['recognized'], counts['failed']
@@ -0,0 +1,159 @@
+import logging
+import os
+import re
+import time
+
+from poster_ocr.gui.util.excpetion import OcrFailedException
+
+logger = logging.getLogger(__name__)
+
+TAG_FILE_SUFFIX = '.txt'
+
+_WORD_SPLIT = re.compile(r'[\W_]+')
+
+
+class OcrEngine:
+    """Turn a poster file into the pieces of text printed on it
+
+    Engines are pickled into the worker processes of OcrWorkerPool, so they
+    should only hold their settings and create heavy resources lazily in
+    recognize().
+
+    preprocess holds the PreprocessOptions of the engine, None to feed
+    pictures as they are. regions holds the RegionOptions of text region
+    detection, None to recognize whole pictures.
+    """
+    name = 'base'
+    version = '0'
+    preprocess = None
+    regions = None
+
+    @property
+    def key(self) -> str:
+        """Identify the engine and every setting that changes its output
+        """
+        key = '{}:{}'.format(self.name, self.version)
+        if self.preprocess is not None:
+            key += ':' + self.preprocess.key
+        if self.regions is not None:
+            key += ':' + self.regions.key
+        return key
+
+    def load_picture(self, path: str):
+        """Preprocessed picture as a 2-D uint8 array, None without preprocess options
+        """
+        if self.preprocess is None:
+            return None
+        from poster_ocr.ocr.preprocess import preprocess
+        return preprocess(path, self.preprocess)
+
+    def detect(self, path: str) -> [tuple]:
+        """Relative (x, y, width, height) boxes of text on the picture at path,
+        empty without region options or when the whole picture should be read
+        """
+        if self.regions is None:
+            return []
+        from poster_ocr.ocr.regions import detect_text_regions
+        return detect_text_regions(path, self.regions)
+
+    def analyze(self, path: str) -> ([str], [tuple]):
+        """Detect text regions then recognize them, see detect() and recognize()
+        """
+        regions = self.detect(path)
+        return self.recognize(path, regions), regions
+
+    def recognize(self, path: str, regions: [tuple] = None) -> [str]:
+        """Lines of text found on the picture at path, only in regions if any
+
+        :raise OcrFailedException: The picture can not be read or recognized
+        """
+        raise NotImplementedError
+
+
+class FakeOcrEngine(OcrEngine):
+    """Deterministic engine for tests and for machines without an OCR backend
+
+    Text of ``<path>.txt`` is returned line by line when that file exists,
+    otherwise the words of the file name. ``delay`` seconds are spent on
+    every picture to stand in for the real work. The picture is only read
+    when preprocess or region options are given, and its pixels and regions
+    are ignored.
+    """
+    name = 'fake'
+    version = '1'
+
+    def __init__(self, delay=0.0, preprocess=None, regions=None):
+        self.delay = delay
+        self.preprocess = preprocess
+        self.regions = regions
+
+    def recognize(self, path: str, regions: [tuple] = None) -> [str]:
+        if not os.path.isfile(path):
+            raise OcrFailedException('{} is not a file'.format(path))
+        self.load_picture(path)
+        if self.delay:
+            time.sleep(self.delay)
+
+        tag_file = path + TAG_FILE_SUFFIX
+        if os.path.isfile(tag_file):
+            with open(tag_file, 'r', encoding='utf-8') as f:
+                return [line.strip() for line in f if line.strip()]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return [word for word in _WORD_SPLIT.split(stem) if word]
+
+
+class TesseractOcrEngine(OcrEngine):
+    """Recognize with Tesseract through pytesseract, an optional dependency
+    """
+    name = 'tesseract'
+    version = '1'
+
+    def __init__(self, lang='chi_sim+eng', preprocess=None, regions=None):
+        self.lang = lang
+        self.preprocess = preprocess
+        self.regions = regions
+
+    @property
+    def key(self) -> str:
+        return '{}:{}'.format(super(TesseractOcrEngine, self).key, self.lang)
+
+    @staticmethod
+    def is_available() -> bool:
+        try:
+            import pytesseract  # noqa
+            import PIL  # noqa
+        except ImportError:
+            return False
+        return True
+
+    def recognize(self, path: str, regions: [tuple] = None) -> [str]:
+        import pytesseract
+        from PIL import Image
+        from poster_ocr.ocr.regions import crop_regions, pixel_box
+
+        try:
+            picture = self.load_picture(path)
+            if picture is not None:
+                crops = [Image.fromarray(crop) for crop in crop_regions(picture, regions)]
+            else:
+                with Image.open(path) as image:
+                    image.load()
+                    if regions:
+                        crops = [image.crop(pixel_box(box, *image.size)) for box in regions]
+                    else:
+                        crops = [image.copy()]
+            texts = [pytesseract.image_to_string(crop, lang=self.lang) for crop in crops]
+        except (OSError, pytesseract.TesseractError) as e:
+            raise OcrFailedException(str(e))
+        return [line.strip() for text in texts for line in text.splitlines() if line.strip()]
+
+
+def create_engine() -> OcrEngine:
+    """Best engine available on this machine
+    """
+    if TesseractOcrEngine.is_available():
+        from poster_ocr.ocr.preprocess import PreprocessOptions
+        from poster_ocr.ocr.regions import RegionOptions
+        return TesseractOcrEngine(preprocess=PreprocessOptions(), regions=RegionOptions())
+    logger.warning('pytesseract is not installed, falling back to FakeOcrEngine')
+    return FakeOcrEngine()
@@ -0,0 +1,186 @@
+"""
+fuzzy
+~~~~~
+
+Find known titles and names close to noisy OCR text.
+
+Text is compared in folded form, see fold(), by edit distance. The index
+keeps posting lists of character trigrams, by length of the name. An edit
+changes at most three trigrams of a text, so a name within L edits of a
+query shares at least one of any 3L + 1 trigrams of the query: only the
+postings of its rarest 3L + 1 trigrams are read, only for names of a close
+enough length, and only names sharing enough trigrams are compared. The
+search starts with exact matches and allows one more edit at a time, so a
+query misread by a character or two reads few postings.
+"""
+
+import heapq
+import re
+import unicodedata
+
+DEFAULT_MAX_RATIO = 0.34
+DEFAULT_MIN_SCORE = 0.75
+DEFAULT_MAX_EDITS = 3
+
+_NOT_ALNUM = re.compile(r'[\W_]+')
+_GRAM = 3
+# Padding puts the first and last characters in as many trigrams as the others
+_START, _END = '\x02', '\x03'
+
+
+def fold(text: str) -> str:
+    """Text reduced to its casefolded letters and digits, the form names are matched in
+
+    OCR drops and inserts spaces and punctuation freely, so they are ignored.
+    """
+    return _NOT_ALNUM.sub('', unicodedata.normalize('NFKC', text).casefold())
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance of a and b, limit + 1 as soon as it exceeds limit
+
+    Only cells within limit of the diagonal can stay under limit, so only
+    those are computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+    over = limit + 1
+    width = len(a)
+    previous = [j if j <= limit else over for j in range(width + 1)]
+    for i in range(1, len(b) + 1):
+        cb = b[i - 1]
+        current = [over] * (width + 1)
+        current[0] = lowest = i if i <= limit else over
+        for j in range(max(1, i - limit), min(width, i + limit) + 1):
+            cost = previous[j - 1] + (a[j - 1] != cb)
+            if previous[j] < cost:
+                cost = previous[j] + 1
+            if current[j - 1] < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost if cost < over else over
+            if cost < lowest:
+                lowest = cost
+        if lowest > limit:
+            return over
+        previous = current
+    return previous[width]
+
+
+def similarity(a: str, b: str) -> float:
+    """1 for texts folding alike, down to 0 as their edit distance reaches the longest length
+    """
+    a, b = fold(a), fold(b)
+    longest = max(len(a), len(b))
+    if longest == 0:
+        return 0.0
+    return 1.0 - edit_distance(a, b, longest) / longest
+
+
+def _grams(key: str) -> set:
+    padded = _START * (_GRAM - 1) + key + _END * (_GRAM - 1)
+    return {padded[i:i + _GRAM] for i in range(len(padded) - _GRAM + 1)}
+
+
+class FuzzyIndex:
+    """Names by folded text, searched for the nearest ones to a query
+
+    A payload is kept with every name and returned with it. Adding a name
+    folding like one already indexed is refused.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._names = []
+        self._payloads = []
+        self._ids = {}
+        self._postings = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, text: str):
+        return fold(text) in self._ids
+
+    def add(self, name: str, payload=None) -> bool:
+        key = fold(name)
+        if not key or key in self._ids:
+            return False
+        entry_id = len(self._keys)
+        self._ids[key] = entry_id
+        self._keys.append(key)
+        self._names.append(name)
+        self._payloads.append(payload)
+        for gram in _grams(key):
+            self._postings.setdefault(gram, {}).setdefault(len(key), []).append(entry_id)
+        return True
+
+    def nearest(self, text: str, k=5, max_ratio=DEFAULT_MAX_RATIO, max_edits=DEFAULT_MAX_EDITS) \
+            -> [(str, object, float)]:
+        """Up to k (name, payload, score) nearest to text, best first
+
+        Names further than max_ratio of the query length, or max_edits, in
+        edits are not considered. Score is 1 for a name folding like text,
+        1 - edits / longest length otherwise.
+        """
+        key = fold(text)
+        if len(key) < 2:
+            entry_id = self._ids.get(key)
+            return [] if entry_id is None else [self._result(entry_id, 1.0)]
+        limit = min(max_edits, max(1, int(len(key) * max_ratio)))
+
+        # Postings of names whose length is within limit of the query, by trigram
+        lengths = range(len(key) - limit, len(key) + limit + 1)
+        postings = {}
+        for gram in _grams(key):
+            by_length = self._postings.get(gram, {})
+            postings[gram] = [by_length[length] for length in lengths if length in by_length]
+        grams = sorted(postings, key=lambda g: sum(map(len, postings[g])))
+        needed = len(grams)
+
+        keys = self._keys
+        # Worst of the k best found so far on top, as (-distance, -entry id)
+        found = []
+        seen = set()
+        # Widen the search one edit at a time, names within `edits` of the
+        # query all share one of its 3 * edits + 1 rarest trigrams
+        for edits in range(limit + 1):
+            candidates = set()
+            for gram in grams[:_GRAM * edits + 1]:
+                for ids in postings[gram]:
+                    candidates.update(ids)
+            candidates -= seen
+            seen |= candidates
+            for entry_id in sorted(candidates):
+                bound = -found[0][0] if len(found) == k else limit
+                other = keys[entry_id]
+                if abs(len(other) - len(key)) > bound:
+                    continue
+                # Count filter, much cheaper than the distance it saves
+                if len(postings.keys() & _grams(other)) < needed - _GRAM * bound:
+                    continue
+                distance = edit_distance(key, other, bound)
+                if distance > bound:
+                    continue
+                heapq.heappush(found, (-distance, -entry_id))
+                if len(found) > k:
+                    heapq.heappop(found)
+            if len(found) == k and -found[0][0] <= edits:
+                break
+
+        scored = [(1.0 + distance / max(len(key), len(keys[-neg_id])), -neg_id) for distance, neg_id in found]
+        scored.sort(key=lambda s: (-s[0], s[1]))
+        return [self._result(entry_id, score) for score, entry_id in scored]
+
+    def best(self, text: str, min_score=DEFAULT_MIN_SCORE) -> (str, object, float):
+        """Nearest (name, payload, score) scoring at least min_score, None if there is none
+        """
+        # score >= min_score bounds edits by (1 - min_score) / min_score of the query length
+        nearest = self.nearest(text, 1, (1.0 - min_score) / min_score if min_score > 0 else 1.0)
+        if nearest and nearest[0][2] >= min_score:
+            return nearest[0]
+        return None
+
+    def _result(self, entry_id: int, score: float) -> (str, object, float):
+        return self._names[entry_id], self._payloads[entry_id], score
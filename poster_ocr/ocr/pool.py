@@ -0,0 +1,211 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from poster_ocr.cache.ocr_cache import OcrCache
+from poster_ocr.gui.util import aio
+from poster_ocr.gui.util.dispatch import Signal
+from poster_ocr.gui.util.excpetion import OcrFailedException, OcrQueueFullException, OcrTimeoutException
+from poster_ocr.ocr.engine import OcrEngine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 16
+DEFAULT_TIMEOUT = 60.0
+
+_engine = None
+
+
+def _init_worker(engine: OcrEngine):
+    global _engine
+    _engine = engine
+
+
+def _analyze(path: str) -> ([str], [tuple]):
+    return _engine.analyze(path)
+
+
+class OcrWorkerPool:
+    """Run an OcrEngine in worker processes
+
+    Every worker process holds its own copy of the engine, so recognition
+    never competes with the Qt event loop for the GIL. Workers are spawned
+    rather than forked, the threads of the GUI process are not copied. At most
+    ``max_workers`` jobs run at once and at most ``max_pending`` are
+    accepted, running ones included; submit() refuses more with
+    OcrQueueFullException. Submitting a path already pending joins its job.
+
+    A job running longer than ``timeout`` seconds fails with
+    OcrTimeoutException. A process can not be interrupted, so the workers
+    are replaced and jobs that were running beside it are retried once.
+
+    With an OcrCache, a picture whose content was recognized before by the
+    same engine settings is answered without a worker, whatever its path.
+
+    Results are emitted through recognized, text regions the engine cropped
+    through regions_found and failures through failed, unless every
+    submitter of the job asked not to be notified.
+    """
+
+    def __init__(self, engine: OcrEngine, max_workers=None, max_pending=DEFAULT_MAX_PENDING,
+                 timeout=DEFAULT_TIMEOUT, cache: OcrCache = None):
+        self._engine = engine
+        self._cache = cache
+        self._max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self._max_pending = max_pending
+        self._timeout = timeout
+
+        self._executor = None
+        self._slots = None
+        self._jobs = {}
+        self._notified = set()
+
+        self.recognized = Signal('recognized', str, list)
+        """Emitted with (path, tags)"""
+
+        self.regions_found = Signal('regions_found', str, list)
+        """Emitted with (path, relative (x, y, width, height) boxes), before recognized"""
+
+        self.failed = Signal('failed', str, str)
+        """Emitted with (path, error description)"""
+
+    @property
+    def engine(self) -> OcrEngine:
+        return self._engine
+
+    @property
+    def cache(self) -> OcrCache:
+        return self._cache
+
+    @property
+    def max_pending(self) -> int:
+        return self._max_pending
+
+    def pending_count(self) -> int:
+        return len(self._jobs)
+
+    def is_pending(self, path: str) -> bool:
+        return path in self._jobs
+
+    def submit(self, path: str, notify=True) -> asyncio.Task:
+        """Recognize path in background
+
+        :param notify: Emit the result through recognized or failed, done
+                       if any submitter of the job asks for it
+        :raise OcrQueueFullException: max_pending jobs are already pending
+        """
+        task = self._jobs.get(path)
+        if task is not None:
+            if notify:
+                self._notified.add(path)
+            return task
+        if len(self._jobs) >= self._max_pending:
+            raise OcrQueueFullException('{} pictures are already being recognized'.format(len(self._jobs)))
+        task = aio.create_task(self._run(path))
+        self._jobs[path] = task
+        if notify:
+            self._notified.add(path)
+        task.add_done_callback(lambda t: self._on_done(path, t))
+        return task
+
+    async def recognize(self, path: str, notify=True) -> [str]:
+        """Tags of path, the job goes on if the caller is cancelled
+
+        :raise OcrQueueFullException: max_pending jobs are already pending
+        """
+        return await asyncio.shield(self.submit(path, notify))
+
+    def cancel(self, path: str) -> bool:
+        """Cancel the job of path, its result is dropped if it is running already
+        """
+        task = self._jobs.get(path)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def cancel_all(self):
+        for task in list(self._jobs.values()):
+            task.cancel()
+
+    def shutdown(self):
+        """Cancel every job and stop the worker processes
+        """
+        self.cancel_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _on_done(self, path: str, task: asyncio.Task):
+        if self._jobs.get(path) is task:
+            del self._jobs[path]
+            self._notified.discard(path)
+        if not task.cancelled():
+            # Failures were reported through failed already
+            task.exception()
+
+    async def _run(self, path: str) -> [str]:
+        try:
+            tags, regions = await self._recognize_cached(path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:  # noqa
+            logger.warning('Recognize %s failed: %s', path, e)
+            if path in self._notified:
+                self.failed.emit(path, str(e) or e.__class__.__name__)
+            raise
+        if path in self._notified:
+            if regions:
+                self.regions_found.emit(path, list(regions))
+            self.recognized.emit(path, tags)
+        return tags
+
+    async def _recognize_cached(self, path: str) -> ([str], [tuple]):
+        if self._cache is None:
+            return await self._execute(path)
+        engine_key = self._engine.key
+        # Hashing reads the whole file, keep it off the event loop
+        digest, result = await aio.run_in_executor(None, self._cache.lookup, path, engine_key)
+        if result is not None:
+            return result
+        tags, regions = await self._execute(path)
+        if digest is not None:
+            self._cache.put(digest, engine_key, tags, regions)
+        return tags, regions
+
+    async def _execute(self, path: str) -> ([str], [tuple]):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._max_workers)
+        async with self._slots:
+            for attempt in range(2):
+                executor = self._get_executor()
+                future = asyncio.wrap_future(executor.submit(_analyze, path))
+                try:
+                    return await asyncio.wait_for(future, self._timeout)
+                except asyncio.TimeoutError:
+                    self._restart_executor(executor)
+                    raise OcrTimeoutException('recognizing {} took more than {}s'.format(path, self._timeout))
+                except BrokenProcessPool:
+                    # The pool was replaced under this job, or a worker died
+                    self._restart_executor(executor)
+                    if attempt:
+                        raise OcrFailedException('worker process died while recognizing {}'.format(path))
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Forking would copy locks held by threads of the GUI process into the workers
+            self._executor = ProcessPoolExecutor(self._max_workers, mp_context=multiprocessing.get_context('spawn'),
+                                                 initializer=_init_worker, initargs=(self._engine,))
+        return self._executor
+
+    def _restart_executor(self, executor: ProcessPoolExecutor):
+        if executor is not self._executor:
+            return
+        self._executor = None
+        # Neither shutdown() nor cancel() stops a job which already runs
+        for process in list(getattr(executor, '_processes', {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False)
@@ -0,0 +1,195 @@
+"""
+preprocess
+~~~~~~~~~~
+
+Turn a poster into the grayscale, normalized and binarized picture an OCR
+engine works best on.
+
+Pictures are decoded straight to at most ``max_side`` pixels by
+QImageReader, so a huge scan never exists in memory at full size. The
+decoded QImage buffer is read in place through a NumPy view, and every
+later step works on it band by band, so temporaries never exceed
+``band_rows`` rows whatever the picture size.
+"""
+
+import sys
+
+import numpy as np
+from PyQt5.QtCore import QSize, Qt
+from PyQt5.QtGui import QImage, QImageReader
+
+from poster_ocr.gui.util.excpetion import OcrFailedException
+
+DEFAULT_MAX_SIDE = 2000
+DEFAULT_BAND_ROWS = 256
+
+# ITU-R BT.601 luma weights scaled to sum up to 256
+_WEIGHT_R, _WEIGHT_G, _WEIGHT_B = 77, 150, 29
+
+# Byte offset of each channel in a pixel of Format_RGB32
+if sys.byteorder == 'little':
+    _OFFSET_B, _OFFSET_G, _OFFSET_R = 0, 1, 2
+else:
+    _OFFSET_B, _OFFSET_G, _OFFSET_R = 3, 2, 1
+
+
+class PreprocessOptions:
+    """Settings of the preprocessing stage, one set per engine
+
+    :param max_side:      Longest side of the picture handed to the engine
+    :param contrast:      Stretch gray levels so that low_percent and
+                          high_percent of pixels saturate
+    :param binarize:      Threshold to black and white with Otsu's method
+    :param band_rows:     Rows processed at once, bounds temporary memory
+    """
+
+    def __init__(self, max_side=DEFAULT_MAX_SIDE, contrast=True, low_percent=1.0, high_percent=99.0,
+                 binarize=True, band_rows=DEFAULT_BAND_ROWS):
+        self.max_side = max_side
+        self.contrast = contrast
+        self.low_percent = low_percent
+        self.high_percent = high_percent
+        self.binarize = binarize
+        self.band_rows = band_rows
+
+    @property
+    def key(self) -> str:
+        """Settings which change the output, band_rows does not
+        """
+        return 'side={},contrast={}:{}:{},binarize={}'.format(
+            self.max_side, int(self.contrast), self.low_percent, self.high_percent, int(self.binarize))
+
+
+def read_scaled(path: str, max_side=DEFAULT_MAX_SIDE) -> QImage:
+    """Decode path shrunk to fit max_side, as Format_RGB32
+
+    :raise OcrFailedException: path is not a readable picture
+    """
+    reader = QImageReader(path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid() and max(size.width(), size.height()) > max_side:
+        reader.setScaledSize(size.scaled(QSize(max_side, max_side), Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise OcrFailedException('can not read {}: {}'.format(path, reader.errorString()))
+    if image.format() != QImage.Format_RGB32:
+        image = image.convertToFormat(QImage.Format_RGB32)
+    return image
+
+
+def qimage_view(image: QImage) -> np.ndarray:
+    """Read-only (height, width, 4) view on the pixels of a Format_RGB32 image
+
+    Nothing is copied, image must outlive the view.
+    """
+    ptr = image.constBits()
+    ptr.setsize(image.sizeInBytes())
+    rows = np.frombuffer(ptr, np.uint8).reshape(image.height(), image.bytesPerLine())
+    return rows[:, :image.width() * 4].reshape(image.height(), image.width(), 4)
+
+
+def to_qimage(gray: np.ndarray) -> QImage:
+    """Format_Grayscale8 copy of a 2-D uint8 array
+    """
+    gray = np.ascontiguousarray(gray)
+    height, width = gray.shape
+    return QImage(gray.data, width, height, gray.strides[0], QImage.Format_Grayscale8).copy()
+
+
+def _bands(height: int, band_rows: int):
+    for top in range(0, height, band_rows):
+        yield slice(top, min(top + band_rows, height))
+
+
+def to_grayscale(pixels: np.ndarray, band_rows=DEFAULT_BAND_ROWS) -> np.ndarray:
+    """Luma of a (height, width, 4) RGB32 array as a new 2-D uint8 array
+    """
+    height, width = pixels.shape[:2]
+    gray = np.empty((height, width), np.uint8)
+    acc = np.empty((min(band_rows, height), width), np.uint16)
+    for band in _bands(height, band_rows):
+        rows = pixels[band]
+        out = acc[:rows.shape[0]]
+        np.multiply(rows[..., _OFFSET_R], _WEIGHT_R, out=out, dtype=np.uint16)
+        out += rows[..., _OFFSET_G] * np.uint16(_WEIGHT_G)
+        out += rows[..., _OFFSET_B] * np.uint16(_WEIGHT_B)
+        out >>= 8
+        gray[band] = out
+    return gray
+
+
+def histogram(gray: np.ndarray, band_rows=DEFAULT_BAND_ROWS) -> np.ndarray:
+    """Count of every gray level, bincount widens its input so it is fed by bands
+    """
+    hist = np.zeros(256, np.int64)
+    for band in _bands(gray.shape[0], band_rows):
+        hist += np.bincount(gray[band].reshape(-1), minlength=256)
+    return hist
+
+
+def apply_lut(gray: np.ndarray, lut: np.ndarray, band_rows=DEFAULT_BAND_ROWS):
+    """Map every gray level through a 256 entries lookup table, in place
+    """
+    for band in _bands(gray.shape[0], band_rows):
+        np.take(lut, gray[band], out=gray[band])
+
+
+def contrast_lut(hist: np.ndarray, low_percent=1.0, high_percent=99.0) -> np.ndarray:
+    """Lookup table stretching the levels between two percentiles to full range
+    """
+    cdf = np.cumsum(hist)
+    total = cdf[-1]
+    low = int(np.searchsorted(cdf, total * low_percent / 100.0, side='right'))
+    high = int(np.searchsorted(cdf, total * high_percent / 100.0, side='left'))
+    if high <= low:
+        return np.arange(256, dtype=np.uint8)
+    levels = (np.arange(256, dtype=np.float32) - low) * (255.0 / (high - low))
+    return np.clip(levels, 0, 255).round().astype(np.uint8)
+
+
+def otsu_threshold(hist: np.ndarray) -> int:
+    """Level which best splits the histogram into two classes
+    """
+    hist = hist.astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_low = np.cumsum(hist)
+    weight_high = weight_low[-1] - weight_low
+    mass_low = np.cumsum(hist * levels)
+    mean_low = np.divide(mass_low, weight_low, out=np.zeros(256), where=weight_low > 0)
+    mean_high = np.divide(mass_low[-1] - mass_low, weight_high, out=np.zeros(256), where=weight_high > 0)
+    between = weight_low * weight_high * (mean_low - mean_high) ** 2
+    return int(np.argmax(between))
+
+
+def preprocess_image(image: QImage, options: PreprocessOptions = None) -> np.ndarray:
+    """Preprocess a decoded picture into a 2-D uint8 array
+    """
+    options = options or PreprocessOptions()
+    if max(image.width(), image.height()) > options.max_side:
+        image = image.scaled(options.max_side, options.max_side, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    if image.format() != QImage.Format_RGB32:
+        image = image.convertToFormat(QImage.Format_RGB32)
+
+    gray = to_grayscale(qimage_view(image), options.band_rows)
+    if options.contrast or options.binarize:
+        hist = histogram(gray, options.band_rows)
+        if options.contrast:
+            lut = contrast_lut(hist, options.low_percent, options.high_percent)
+            apply_lut(gray, lut, options.band_rows)
+            # Levels were remapped, so is their histogram
+            hist = np.bincount(lut, weights=hist, minlength=256)
+        if options.binarize:
+            threshold = otsu_threshold(hist)
+            lut = np.where(np.arange(256) > threshold, 255, 0).astype(np.uint8)
+            apply_lut(gray, lut, options.band_rows)
+    return gray
+
+
+def preprocess(path: str, options: PreprocessOptions = None) -> np.ndarray:
+    """Read and preprocess the picture at path into a 2-D uint8 array
+
+    :raise OcrFailedException: path is not a readable picture
+    """
+    options = options or PreprocessOptions()
+    return preprocess_image(read_scaled(path, options.max_side), options)
@@ -0,0 +1,169 @@
+"""
+regions
+~~~~~~~
+
+Propose boxes of a poster likely to hold text, so only those crops go
+through OCR.
+
+Printed text is a dense run of sharp strokes while artwork mostly varies
+smoothly, so the picture is decoded small, its strong edges are counted in
+a grid of cells, and runs of dense cells are joined into boxes. Boxes are
+relative to the picture, (x, y, width, height) in [0, 1], so they apply to
+the picture at any scale.
+"""
+
+from collections import deque
+
+import numpy as np
+
+from poster_ocr.ocr.preprocess import qimage_view, read_scaled, to_grayscale
+
+DEFAULT_DETECT_SIDE = 512
+DEFAULT_CELL = 8
+
+
+class RegionOptions:
+    """Settings of text region proposal
+
+    :param detect_side:   Longest side of the picture edges are computed on
+    :param cell:          Side of a grid cell in pixels of that picture
+    :param edge_level:    Gray level difference between neighbours counted as an edge
+    :param min_density:   Share of edge pixels making a cell dense
+    :param join_cells:    Dense cells this far apart on a row belong to one box
+    :param min_cells:     Smaller boxes are dropped
+    :param padding:       Added around boxes, relative to the picture
+    :param max_regions:   Largest boxes kept
+    :param max_coverage:  Boxes covering more of the picture than this are
+                          not worth cropping, the whole picture is used
+    """
+
+    def __init__(self, detect_side=DEFAULT_DETECT_SIDE, cell=DEFAULT_CELL, edge_level=40, min_density=0.12,
+                 join_cells=2, min_cells=3, padding=0.01, max_regions=24, max_coverage=0.7):
+        self.detect_side = detect_side
+        self.cell = cell
+        self.edge_level = edge_level
+        self.min_density = min_density
+        self.join_cells = join_cells
+        self.min_cells = min_cells
+        self.padding = padding
+        self.max_regions = max_regions
+        self.max_coverage = max_coverage
+
+    @property
+    def key(self) -> str:
+        return 'regions={},{},{},{},{},{},{},{},{}'.format(
+            self.detect_side, self.cell, self.edge_level, self.min_density, self.join_cells, self.min_cells,
+            self.padding, self.max_regions, self.max_coverage)
+
+
+def edge_density(gray: np.ndarray, cell=DEFAULT_CELL, edge_level=40) -> np.ndarray:
+    """Share of edge pixels in every cell x cell block, as a 2-D float array
+    """
+    height, width = gray.shape
+    rows, cols = height // cell, width // cell
+    if rows == 0 or cols == 0:
+        return np.zeros((0, 0), np.float32)
+    gray = gray[:rows * cell, :cols * cell].astype(np.int16)
+    edges = np.zeros(gray.shape, np.bool_)
+    edges[:, 1:] = np.abs(gray[:, 1:] - gray[:, :-1]) > edge_level
+    edges[1:, :] |= np.abs(gray[1:, :] - gray[:-1, :]) > edge_level
+    return edges.reshape(rows, cell, cols, cell).mean(axis=(1, 3), dtype=np.float32)
+
+
+def dense_cells(density: np.ndarray, min_density=0.12, join_cells=2) -> np.ndarray:
+    """Boolean grid of dense cells, with gaps up to join_cells along rows filled
+    """
+    mask = density >= min_density
+    if join_cells <= 0 or mask.size == 0:
+        return mask
+    # A gap is filled if dense cells lie on both of its sides within join_cells
+    left = mask.copy()
+    right = mask.copy()
+    for shift in range(1, join_cells + 1):
+        left[:, shift:] |= mask[:, :-shift]
+        right[:, :-shift] |= mask[:, shift:]
+    return mask | (left & right)
+
+
+def _components(mask: np.ndarray):
+    """Yield (top, left, bottom, right, cell count) of 4-connected groups of True cells
+    """
+    seen = np.zeros(mask.shape, np.bool_)
+    rows, cols = mask.shape
+    for start in zip(*np.nonzero(mask)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        queue = deque([start])
+        top, left, bottom, right = start[0], start[1], start[0], start[1]
+        count = 0
+        while queue:
+            r, c = queue.popleft()
+            count += 1
+            top, bottom = min(top, r), max(bottom, r)
+            left, right = min(left, c), max(right, c)
+            for nr, nc in ((r - 1, c), (r + 1, c), (r, c - 1), (r, c + 1)):
+                if 0 <= nr < rows and 0 <= nc < cols and mask[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    queue.append((nr, nc))
+        yield top, left, bottom, right, count
+
+
+def propose_regions(gray: np.ndarray, options: RegionOptions = None) -> [tuple]:
+    """Relative (x, y, width, height) boxes of text on a small 2-D uint8 picture,
+    largest first, empty if cropping would not pay off
+    """
+    options = options or RegionOptions()
+    density = edge_density(gray, options.cell, options.edge_level)
+    if density.size == 0:
+        return []
+    mask = dense_cells(density, options.min_density, options.join_cells)
+    scale_x, scale_y = options.cell / gray.shape[1], options.cell / gray.shape[0]
+
+    boxes = []
+    for top, left, bottom, right, count in _components(mask):
+        if count < options.min_cells:
+            continue
+        x0 = max(0.0, left * scale_x - options.padding)
+        y0 = max(0.0, top * scale_y - options.padding)
+        x1 = min(1.0, (right + 1) * scale_x + options.padding)
+        y1 = min(1.0, (bottom + 1) * scale_y + options.padding)
+        boxes.append((x0, y0, x1 - x0, y1 - y0))
+    boxes.sort(key=lambda b: b[2] * b[3], reverse=True)
+    boxes = boxes[:options.max_regions]
+
+    if sum(b[2] * b[3] for b in boxes) > options.max_coverage:
+        return []
+    return [tuple(round(float(v), 4) for v in box) for box in boxes]
+
+
+def detect_text_regions(path: str, options: RegionOptions = None) -> [tuple]:
+    """Relative boxes of text on the picture at path, see propose_regions()
+
+    :raise OcrFailedException: path is not a readable picture
+    """
+    options = options or RegionOptions()
+    image = read_scaled(path, options.detect_side)
+    return propose_regions(to_grayscale(qimage_view(image)), options)
+
+
+def pixel_box(box: tuple, width: int, height: int) -> (int, int, int, int):
+    """(left, top, right, bottom) pixels of a relative box on a width x height picture
+    """
+    x, y, w, h = box
+    left, top = int(x * width), int(y * height)
+    right, bottom = max(left + 1, int(round((x + w) * width))), max(top + 1, int(round((y + h) * height)))
+    return left, top, min(right, width), min(bottom, height)
+
+
+def crop_regions(picture: np.ndarray, boxes: [tuple]) -> [np.ndarray]:
+    """Views on picture for every box, the whole picture without boxes
+    """
+    if not boxes:
+        return [picture]
+    height, width = picture.shape[:2]
+    crops = []
+    for box in boxes:
+        left, top, right, bottom = pixel_box(box, width, height)
+        crops.append(picture[top:bottom, left:right])
+    return crops
@@ -0,0 +1,450 @@
+"""
+tags
+~~~~
+
+Turn the raw lines an OCR engine read on a poster into the few short tags
+worth searching for.
+
+Release dates and credit or promotion phrases are cut out of lines, which
+are then cut into runs of CJK characters and phrases of Latin words. Every
+known title or name found inside a line by the lexicon is proposed as
+well, spelled as the lexicon knows it. Runs misread by a few characters
+are corrected to the nearest known name. Candidates are ranked by how well
+they match the lexicon and how much they look like a title or a name, then
+near duplicates of better ranked ones are dropped.
+
+The lexicon is an Aho–Corasick automaton over folded text, so finding every
+known name in a line costs one pass over the line whatever the lexicon
+size. Names added later go to a small second automaton, merged into the
+first one on a worker thread. Nothing here needs Qt, the extractor runs
+headless.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import unicodedata
+from collections import deque
+from enum import IntEnum
+
+from poster_ocr.cache.paths import cache_dir
+from poster_ocr.ocr.fuzzy import DEFAULT_MIN_SCORE, FuzzyIndex, edit_distance, fold
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_TAGS = 8
+DEFAULT_MAX_ENTRIES = 50000
+# Names matched by the small automaton at most, before it is merged
+OVERLAY_MAX = 512
+
+_FILE_NAME = 'lexicon.json'
+_FORMAT_VERSION = 1
+
+_CJK = '぀-ヿ㐀-䶿一-鿿豈-﫿가-힯'
+# A run of CJK characters, or Latin words joined by spaces or in-word punctuation
+_SEGMENT = re.compile(r'[{cjk}]+|[^\W_{cjk}]+(?:(?:[ \t]+|[ \t]*[&\'’.·-][ \t]*)[^\W_{cjk}]+)*'.format(cjk=_CJK))
+_IS_CJK = re.compile(r'[{}]'.format(_CJK))
+_HAS_LETTER = re.compile(r'[^\W\d_]')
+
+# Credits and release boilerplate printed on most posters, never a tag
+STOP_WORDS = frozenset([
+    '导演', '编剧', '主演', '领衔主演', '特别出演', '友情出演', '出品', '出品人', '联合出品', '荣誉出品', '监制',
+    '制片人', '总制片人', '发行', '联合发行', '摄影', '剪辑', '音乐', '美术', '上映', '全国上映', '定档',
+    '敬请期待', '电影', '作品', '监督', '脚本', '原作', '出演', '公開',
+    'directedby', 'writtenby', 'producedby', 'musicby', 'starring', 'presents', 'afilmby', 'film', 'movie',
+    'comingsoon', 'intheaters', 'onlyintheaters', 'intheaterssoon', 'inassociationwith',
+])
+
+# Dates and phrases of STOP_WORDS glued to the names they introduce, e.g.
+# 导演张艺谋 or 2024年12月31日全国上映, longest first so they are cut whole
+_BOILERPLATE = re.compile('|'.join([
+    r'\d+\s*[年月日号]',
+    r'\d{1,4}(?:[./-]\d{1,2}){1,2}',
+    r'(?i:\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s*\d{1,2}(?:st|nd|rd|th)?(?:,?\s*\d{4})?\b)',
+    '(?:全国|全球|北美|中国内地|中国大陆|内地|大陆|同步|震撼|即将|盛大|火热)?(?:上映|公映|献映|热映)',
+    '领衔主演|特别出演|友情出演|联合出品|荣誉出品|总制片人|联合发行|敬请期待|预售(?:火热)?(?:进行中|开启)?',
+    '出品人|制片人|导演|導演|编剧|主演|出品|监制|监督|发行|定档|作品',
+    r'(?i:\b(?:directed by|written by|produced by|music by|a film by|in association with|only in theaters'
+    r'|in theaters|coming soon|starring|presents)\b)',
+]))
+
+
+def is_cjk(text: str) -> bool:
+    return _IS_CJK.search(text) is not None
+
+
+def strip_boilerplate(line: str) -> str:
+    """line with dates and credit or promotion phrases replaced by a separator
+    """
+    return _BOILERPLATE.sub(' / ', unicodedata.normalize('NFKC', line))
+
+
+def segments(line: str) -> [str]:
+    """CJK runs and Latin phrases of a line, in order
+    """
+    line = unicodedata.normalize('NFKC', line)
+    return [' '.join(m.group().split()) for m in _SEGMENT.finditer(line)]
+
+
+class LexiconKind(IntEnum):
+    TITLE = 0
+    PERSON = 1
+
+
+KIND_WEIGHTS = {
+    LexiconKind.TITLE: 1.0,
+    LexiconKind.PERSON: 0.8,
+}
+
+
+class _Automaton:
+    """Aho–Corasick automaton over folded keys, built once and never changed
+    """
+
+    def __init__(self, keys: [(str, int)]):
+        # Transitions, failure link, and entries ending at every state or at
+        # any state down its failure links
+        goto = self._goto = [{}]
+        fail = self._fail = [0]
+        out = self._out = [()]
+        for key, entry_id in keys:
+            state = 0
+            for c in key:
+                nxt = goto[state].get(c)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][c] = nxt
+                    goto.append({})
+                    fail.append(0)
+                    out.append(())
+                state = nxt
+            out[state] = (entry_id,)
+
+        # Failure links breadth first, merging outputs along them
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, nxt in goto[state].items():
+                link = fail[state]
+                while link and c not in goto[link]:
+                    link = fail[link]
+                fail[nxt] = goto[link].get(c, 0)
+                out[nxt] = out[nxt] + out[fail[nxt]]
+                queue.append(nxt)
+
+    def find(self, key: str, lengths: [int], found: list):
+        """Append (start, end, entry id) of every entry found in key to found
+        """
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, c in enumerate(key):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+            for entry_id in out[state]:
+                found.append((i + 1 - lengths[entry_id], i + 1, entry_id))
+
+
+class TagLexicon:
+    """Known titles and people, matched in folded text by an Aho–Corasick automaton
+
+    Names are added at any time. Building the automaton takes a while for a
+    large lexicon, so names added after it was built go to a second one over
+    at most OVERLAY_MAX names, cheap to rebuild on the next match. Past that,
+    a new automaton over every name is built on a worker thread and swapped
+    in once done. Names folding to less than 2 characters, or to less than 4
+    for Latin ones, match inside too many words and are refused. At most
+    ``max_entries`` names are kept, later ones are refused.
+
+    Names are also kept in a FuzzyIndex, for nearest(), best() and correct().
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self._max_entries = max_entries
+        # name, kind
+        self._entries = []
+        self._keys = []
+        self._lengths = []
+        self._ids = {}
+        self._fuzzy = FuzzyIndex()
+
+        # Automaton over the first entries and their count, swapped as a whole
+        self._base = (_Automaton(()), 0)
+        # Automaton over the entries after them: automaton, first and end id
+        self._overlay = (_Automaton(()), 0, 0)
+        self._merging = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, name: str):
+        return fold(name) in self._ids
+
+    def entries(self) -> [(str, LexiconKind)]:
+        return list(self._entries)
+
+    def add(self, name: str, kind=LexiconKind.TITLE) -> bool:
+        """Add name if it is new and specific enough
+        """
+        name = ' '.join(name.split())
+        key = fold(name)
+        if len(key) < 2 or (len(key) < 4 and not is_cjk(key)):
+            return False
+        if key in self._ids or len(self._entries) >= self._max_entries:
+            return False
+        self._ids[key] = len(self._entries)
+        self._entries.append((name, LexiconKind(kind)))
+        self._keys.append(key)
+        self._lengths.append(len(key))
+        self._fuzzy.add(name, LexiconKind(kind))
+        return True
+
+    def add_movie_infos(self, infos) -> int:
+        """Add titles and staffs of crawled DoubanMovieInfo
+
+        A title like ``霸王别姬 Farewell My Concubine`` is also added per
+        script, posters rarely print both.
+
+        :return: Number of names added
+        """
+        added = 0
+        for info in infos:
+            title = info.title_display or ''
+            added += self.add(title, LexiconKind.TITLE)
+            parts = segments(title)
+            if len(parts) > 1:
+                added += sum(self.add(part, LexiconKind.TITLE) for part in parts)
+            # Staffs are joined by ' / ', see douban_parser
+            for name in (info.staffs_display or '').split('/'):
+                added += self.add(name, LexiconKind.PERSON)
+        return added
+
+    def find(self, text: str) -> [(int, int, int)]:
+        """(start, end, entry id) of every name found in the folded form of text
+        """
+        key = fold(text)
+        found = []
+        base, count = self._base
+        base.find(key, self._lengths, found)
+        if count < len(self._keys):
+            self._updated_overlay(count).find(key, self._lengths, found)
+        return found
+
+    def names_in(self, text: str) -> [(str, LexiconKind)]:
+        """Names found in text, the longest of overlapping ones only
+        """
+        found = sorted(self.find(text), key=lambda m: (m[0], m[0] - m[1]))
+        names = []
+        end = 0
+        for start, stop, entry_id in found:
+            if start >= end:
+                names.append(self._entries[entry_id])
+                end = stop
+        return names
+
+    def lookup(self, text: str) -> (str, LexiconKind):
+        """Entry whose name folds like text, None if there is none
+        """
+        entry_id = self._ids.get(fold(text))
+        return None if entry_id is None else self._entries[entry_id]
+
+    def nearest(self, text: str, k=5) -> [(str, LexiconKind, float)]:
+        """Up to k (name, kind, score) closest to text by edit distance, best first
+        """
+        return self._fuzzy.nearest(text, k)
+
+    def best(self, text: str, min_score=DEFAULT_MIN_SCORE) -> (str, LexiconKind, float):
+        """Nearest (name, kind, score) scoring at least min_score, None if there is none
+        """
+        return self._fuzzy.best(text, min_score)
+
+    def correct(self, text: str, min_score=DEFAULT_MIN_SCORE) -> str:
+        """Name nearest to text if it scores at least min_score, text itself otherwise
+        """
+        best = self._fuzzy.best(text, min_score)
+        return text if best is None else best[0]
+
+    def build(self):
+        """Build the automaton over every name now, e.g. after adding many at once
+        """
+        self._merge(list(self._keys))
+
+    def _updated_overlay(self, start: int) -> _Automaton:
+        """Automaton over the entries from start on, merged in the background once there are many
+        """
+        end = len(self._keys)
+        overlay, overlay_start, overlay_end = self._overlay
+        if (overlay_start, overlay_end) != (start, end):
+            overlay = _Automaton(zip(self._keys[start:end], range(start, end)))
+            self._overlay = (overlay, start, end)
+        if end - start > OVERLAY_MAX and self._merging is None:
+            self._merging = threading.Thread(target=self._merge_in_background, args=(self._keys[:end],),
+                                             name='lexicon-merge', daemon=True)
+            self._merging.start()
+        return overlay
+
+    def _merge(self, keys: [str]):
+        """Build the automaton over keys and swap it in, unless one over more is in already
+        """
+        base = _Automaton(zip(keys, range(len(keys))))
+        if len(keys) > self._base[1]:
+            self._base = (base, len(keys))
+
+    def _merge_in_background(self, keys: [str]):
+        try:
+            self._merge(keys)
+        except Exception:  # noqa
+            logger.exception('merge lexicon failed')
+        finally:
+            self._merging = None
+
+    @classmethod
+    def default_path(cls) -> str:
+        return os.path.join(cache_dir('tags'), _FILE_NAME)
+
+    @classmethod
+    def load(cls, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        """Lexicon saved at path, empty if there is none
+        """
+        path = path or cls.default_path()
+        lexicon = cls(max_entries)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return lexicon
+        except (OSError, ValueError):
+            logger.warning('read lexicon %s failed', path, exc_info=True)
+            return lexicon
+        if data.get('version') == _FORMAT_VERSION:
+            for name, kind in data.get('entries', []):
+                lexicon.add(name, kind)
+            lexicon.build()
+        return lexicon
+
+    def save(self, path=None):
+        """Write names to path through a temp file renamed into place
+        """
+        path = path or self.default_path()
+        data = {
+            'version': _FORMAT_VERSION,
+            'entries': [[name, int(kind)] for name, kind in self._entries],
+        }
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning('write lexicon %s failed', path, exc_info=True)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+class _Candidate:
+    __slots__ = ('text', 'key', 'score', 'first', 'count')
+
+    def __init__(self, text: str, key: str, score: float, first: int):
+        self.text = text
+        self.key = key
+        self.score = score
+        self.first = first
+        self.count = 1
+
+
+class TagExtractor:
+    """Rank the pieces of OCR text by how likely they are a title or a name
+
+    :param lexicon:     Known titles and people, candidates found in it rank first
+    :param max_tags:    Tags returned at most
+    :param min_score:   Candidates this close to a known name are replaced by it
+    """
+    LEXICON_BONUS = 4.0
+    REPEAT_BONUS = 0.2
+
+    def __init__(self, lexicon: TagLexicon = None, max_tags=DEFAULT_MAX_TAGS, min_score=DEFAULT_MIN_SCORE):
+        self.lexicon = lexicon if lexicon is not None else TagLexicon()
+        self.max_tags = max_tags
+        self.min_score = min_score
+
+    def extract(self, lines: [str]) -> [str]:
+        """Best tags of the lines read on one poster, best first
+        """
+        candidates = {}
+        line_keys = set()
+
+        def propose(text, score):
+            key = fold(text)
+            candidate = candidates.get(key)
+            if candidate is None:
+                candidates[key] = _Candidate(text, key, score, len(candidates))
+            else:
+                # Repeated on another line, not found twice on the same one
+                if key not in line_keys:
+                    candidate.count += 1
+                if score > candidate.score:
+                    candidate.text, candidate.score = text, score
+            line_keys.add(key)
+
+        for line in lines:
+            line_keys.clear()
+            # Known names first, so they are spelled as the lexicon knows them
+            for name, kind in self.lexicon.names_in(line):
+                propose(name, self._shape_score(name) + self.LEXICON_BONUS * KIND_WEIGHTS[kind])
+            for segment in segments(strip_boilerplate(line)):
+                shape = self._shape_score(segment)
+                if shape <= 0 or fold(segment) in STOP_WORDS:
+                    continue
+                # Known names were proposed by names_in() already
+                best = None if segment in self.lexicon else self.lexicon.best(segment, self.min_score)
+                if best is not None:
+                    name, kind, score = best
+                    propose(name, shape + self.LEXICON_BONUS * KIND_WEIGHTS[kind] * score)
+                else:
+                    propose(segment, shape)
+
+        ranked = sorted(candidates.values(), key=lambda c: (-(c.score + self.REPEAT_BONUS * (c.count - 1)), c.first))
+        tags = []
+        kept = []
+        for candidate in ranked:
+            if any(self._is_near_duplicate(candidate.key, key) for key in kept):
+                continue
+            kept.append(candidate.key)
+            tags.append(candidate.text)
+            if len(tags) >= self.max_tags:
+                break
+        return tags
+
+    @staticmethod
+    def _shape_score(text: str) -> float:
+        """How much text looks like a title or a name by its length, 0 for noise
+        """
+        if is_cjk(text):
+            length = len(text.replace(' ', ''))
+            if length < 2 or length > 20:
+                return 0.0
+            return 1.0 if length <= 8 else 0.5
+        if _HAS_LETTER.search(text) is None:
+            return 0.0
+        words = len(text.split())
+        letters = sum(c.isalpha() for c in text)
+        if letters < 3 or len(text) > 40:
+            return 0.0
+        return 1.0 if words <= 4 else 0.5
+
+    @staticmethod
+    def _is_near_duplicate(key: str, other: str) -> bool:
+        """Same text but for OCR noise, or a part of a better ranked one
+        """
+        if key in other or other in key:
+            return True
+        if min(len(key), len(other)) < 4:
+            return False
+        return edit_distance(key, other, 1) <= 1
@@ -1,5 +1,12 @@
-import requests
-from PyQt5.QtGui import QPixmap
+import asyncio
+import threading
+
+from PyQt5.QtGui import QPixmap, QImage
+
+from poster_ocr.gui.util import aio
+from poster_ocr.gui.util.pixmap_cache import pixmap_cache
+from poster_ocr.net.rate_limiter import Priority, get_rate_limiter
+from poster_ocr.net.session import fetch_bytes, http_executor
 
 
 class DoubanMovieInfo:
@@ -12,8 +19,52 @@ class DoubanMovieInfo:
         self.rate_display = rate
         self.description_display = other_des
 
-    def load_photo(self) -> QPixmap:
-        req = requests.get(self.photo_url)
-        photo = QPixmap()
-        photo.loadFromData(req.content)
-        return photo
+    def to_dict(self) -> dict:
+        """JSON serializable form, see from_dict()
+        """
+        return {
+            'title': self.title_display,
+            'staffs': self.staffs_display,
+            'photo_url': self.photo_url,
+            'show_time': self.date_display,
+            'rate': self.rate_display,
+            'other_des': self.description_display,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(d.get('title', ''), d.get('staffs', ''), d.get('photo_url', ''), d.get('show_time', ''),
+                   d.get('rate', ''), d.get('other_des') or {})
+
+    def fetch_photo_image(self, cancel_event: threading.Event = None) -> QImage:
+        """Download and decode the photo, blocking
+
+        QImage is safe to build off the GUI thread, so this is meant to run
+        in a worker thread.
+        """
+        data = fetch_bytes(self.photo_url, cancel_event)
+        image = QImage()
+        image.loadFromData(data)
+        return image
+
+    async def load_photo(self, priority=Priority.INTERACTIVE) -> QPixmap:
+        """Load the photo without blocking the event loop
+
+        Downloading and decoding run on the shared HTTP executor, only the
+        conversion to QPixmap happens on the loop thread. Cancelling the
+        awaiting task also stops the download in the worker.
+
+        The download waits for a token of the shared rate limiter at priority.
+        """
+        photo = pixmap_cache.find(self.photo_url)
+        if photo is not None:
+            return photo
+
+        await get_rate_limiter().acquire(self.photo_url, priority)
+        cancel_event = threading.Event()
+        try:
+            image = await aio.run_in_executor(http_executor, self.fetch_photo_image, cancel_event)
+        except asyncio.CancelledError:
+            cancel_event.set()
+            raise
+        return pixmap_cache.insert(self.photo_url, QPixmap.fromImage(image))